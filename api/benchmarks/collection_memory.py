@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Memory used to process a very large CIMI collection, in memory (no server).
+
+ A response of synthetic events is decoded and each event is processed
+ (counted by type) with a regular CimiCollection and with a
+ StreamingCimiCollection. The peak memory includes the decoded response::
+
+    $ python benchmarks/collection_memory.py --resources 100000
+    $ python benchmarks/collection_memory.py --resources 100000 --output memory.json
+
+"""
+
+from __future__ import absolute_import, print_function
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import collections
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from slipstream.api import models  # noqa: E402
+
+from fake_server import cimi_resources, _uuid  # noqa: E402
+
+RESOURCE_TYPE = 'events'
+
+MODES = collections.OrderedDict()
+
+
+def mode(func):
+    MODES[func.__name__] = func
+    return func
+
+
+def _process(resources):
+    types = collections.Counter()
+    for resource in resources:
+        types[resource.type] += 1
+    return types
+
+
+@mode
+def decode_only(body):
+    data = json.loads(body)
+    return len(data[RESOURCE_TYPE]), data
+
+
+@mode
+def collection(body):
+    resources = models.CimiCollection(json.loads(body), RESOURCE_TYPE)
+    return sum(_process(resources).values()), resources
+
+
+@mode
+def collection_list(body):
+    resources = models.CimiCollection(json.loads(body), RESOURCE_TYPE)
+    return sum(_process(resources.resources_list).values()), resources
+
+
+@mode
+def streaming(body):
+    resources = models.StreamingCimiCollection(json.loads(body), RESOURCE_TYPE)
+    return sum(_process(resources).values()), resources
+
+
+@mode
+def streaming_retain(body):
+    resources = models.StreamingCimiCollection(json.loads(body), RESOURCE_TYPE, retain=True)
+    return sum(_process(resources).values()), resources
+
+
+def _measure(func, body):
+    if tracemalloc is None:
+        start = time.time()
+        count, _ = func(body)
+        return collections.OrderedDict([('resources', count), ('time', time.time() - start)])
+
+    tracemalloc.start()
+    start = time.time()
+    count, result = func(body)
+    elapsed = time.time() - start
+    # Memory still used while the caller holds the collection
+    retained = tracemalloc.get_traced_memory()[0]
+    del result
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return collections.OrderedDict([
+        ('resources', count),
+        ('time', elapsed),
+        ('peak_memory_bytes', peak),
+        ('retained_memory_bytes', retained),
+    ])
+
+
+def run(modes, resources, seed=42):
+    rnd = random.Random(seed)
+    run_ids = [_uuid(rnd) for _ in range(100)]
+    body = json.dumps({'count': resources,
+                       'resourceURI': 'http://sixsq.com/slipstream/1/Collection',
+                       RESOURCE_TYPE: cimi_resources(rnd, 'event', resources, run_ids)})
+    results = collections.OrderedDict()
+    for name in modes:
+        print('Running {0}...'.format(name), file=sys.stderr)
+        results[name] = _measure(MODES[name], body)
+    return collections.OrderedDict([
+        ('resources', resources),
+        ('body_bytes', len(body)),
+        ('results', results),
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', action='append', choices=list(MODES.keys()),
+                        help='Mode to run (can be repeated). Default to all.')
+    parser.add_argument('--resources', type=int, default=100000, help='Number of resources of the collection.')
+    parser.add_argument('--output', help='Write the results as JSON in this file.')
+    args = parser.parse_args(argv)
+
+    results = run(args.mode or list(MODES.keys()), args.resources)
+
+    print('{0:20}{1:>12}{2:>14}{3:>14}'.format('mode', 'time', 'peak', 'retained'))
+    for name, result in results['results'].items():
+        print('{0:20}{1:>10.2f}s{2:>12.1f}MB{3:>12.1f}MB'.format(
+            name, result['time'], result.get('peak_memory_bytes', 0) / 1e6,
+            result.get('retained_memory_bytes', 0) / 1e6))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ A local stand-in for a SlipStream server, serving synthetic documents of
+ configurable sizes with a configurable latency.
+
+ Only the resources used by the benchmarks are implemented: /run, /vms,
+ /module, /appstore, /dashboard, /user and the CIMI /api/cloud-entry-point,
+ /api/session and collection searches.
+"""
+
+from __future__ import absolute_import, print_function
+
+import re
+import json
+import time
+import uuid
+import random
+import threading
+
+from xml.etree import ElementTree as etree
+
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import urlparse
+
+CLOUDS = ['exoscale-ch-gva', 'exoscale-ch-dk', 'open-telekom-de1', 'ifb-core-cloud']
+STATES = ['Initializing', 'Provisioning', 'Executing', 'SendingReports', 'Ready', 'Done', 'Aborted']
+
+DEFAULT_SIZES = dict(runs=500, vms=2000, cimi=1000, module_breadth=5, module_depth=3, appstore=50,
+                     user_parameters=200)
+
+
+def _uuid(rnd):
+    return str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+
+
+def _xml(element):
+    return etree.tostring(element, 'UTF-8')
+
+
+def cimi_resources(rnd, collection, count, run_ids):
+    """Synthetic CIMI resources (events like) of a collection."""
+    resources = []
+    for i in range(count):
+        resources.append({
+            'id': '{0}/{1}'.format(collection, _uuid(rnd)),
+            'resourceURI': 'http://sixsq.com/slipstream/1/{0}'.format(collection.capitalize()),
+            'created': '2017-06-01T10:00:00.000Z',
+            'updated': '2017-06-01T10:00:00.000Z',
+            'timestamp': '2017-06-01T10:{0:02d}:{1:02d}.000Z'.format(i // 60 % 60, i % 60),
+            'type': rnd.choice(['state', 'alarm', 'action']),
+            'severity': rnd.choice(['low', 'medium', 'high']),
+            'content': {'resource': {'href': 'run/' + rnd.choice(run_ids)}, 'state': 'Ready'},
+            'acl': {'owner': {'principal': 'user', 'type': 'USER'}},
+        })
+    return resources
+
+
+class Documents(object):
+    """Pre-generated synthetic documents, so that serving them costs (almost) nothing."""
+
+    def __init__(self, seed=42, **sizes):
+        self.sizes = dict(DEFAULT_SIZES, **sizes)
+        rnd = random.Random(seed)
+        self.run_ids = [_uuid(rnd) for _ in range(self.sizes['runs'])]
+        self.runs = self._runs(rnd)
+        self.run_docs = dict((run_id, self._run(rnd, run_id)) for run_id in self.run_ids[:50])
+        self.vms = self._vms(rnd)
+        self.modules = {}
+        self._module_tree(rnd, 'module/', '', self.sizes['module_depth'])
+        self.appstore = self._appstore(rnd)
+        self.dashboard = self._dashboard(rnd)
+        self.user = self._user(rnd)
+        self.cimi = dict((collection, self._cimi_collection(rnd, collection, resource_type))
+                         for collection, resource_type in (('event', 'events'), ('credential', 'credentials'),
+                                                           ('session', 'sessions')))
+
+    def _runs(self, rnd):
+        root = etree.Element('runs', count=str(len(self.run_ids)))
+        for run_id in self.run_ids:
+            etree.SubElement(root, 'item', uuid=run_id,
+                             moduleResourceUri='module/apps/app-{0}/1'.format(rnd.randint(0, 20)),
+                             status=rnd.choice(STATES),
+                             startTime='2017-06-01 10:00:00.0 UTC',
+                             lastStateChangeTime='2017-06-01 10:{0:02d}:00.0 UTC'.format(rnd.randint(0, 59)),
+                             cloudServiceNames=rnd.choice(CLOUDS),
+                             username='user-{0}'.format(rnd.randint(0, 10)),
+                             abort='', serviceUrl='http://10.0.0.1', mutable='false')
+        return _xml(root)
+
+    def _run(self, rnd, run_id):
+        root = etree.Element('run', uuid=run_id, moduleResourceUri='module/apps/app/1', state='Ready',
+                             startTime='2017-06-01 10:00:00.0 UTC',
+                             lastStateChangeTime='2017-06-01 10:05:00.0 UTC',
+                             cloudServiceNames=rnd.choice(CLOUDS), user='user', mutable='true')
+        params = etree.SubElement(root, 'runtimeParameters')
+        for key in ['ss:abort', 'ss:url.service', 'ss:state'] + \
+                ['node.{0}:param-{1}'.format(i, j) for i in range(1, 11) for j in range(20)]:
+            entry = etree.SubElement(params, 'entry')
+            etree.SubElement(entry, 'string').text = key
+            etree.SubElement(entry, 'runtimeParameter', key=key).text = 'value-of-' + key
+        return _xml(root)
+
+    def _vms(self, rnd):
+        root = etree.Element('vms', count=str(self.sizes['vms']))
+        for i in range(self.sizes['vms']):
+            etree.SubElement(root, 'vm', instanceId='i-{0:08x}'.format(i), cloud=rnd.choice(CLOUDS),
+                             state=rnd.choice(['Running', 'Stopped', 'Terminated']),
+                             runUuid=rnd.choice(self.run_ids), runOwner='user-{0}'.format(rnd.randint(0, 10)),
+                             nodeName='node', nodeInstanceId='node.{0}'.format(i), ip='10.0.{0}.{1}'.format(
+                                 i // 256 % 256, i % 256),
+                             cpu=str(rnd.choice([1, 2, 4, 8])), ram=str(rnd.choice([1024, 2048, 8192])),
+                             disk=str(rnd.choice([10, 50, 100])), instanceType='medium', isUsable='true')
+        return _xml(root)
+
+    def _module_tree(self, rnd, parent_uri, path, depth):
+        short_name = path.rsplit('/', 1)[-1] if path else ''
+        root = etree.Element('projectModule' if path else 'list', parentUri=parent_uri, shortName=short_name,
+                             category='Project', version='1', lastModified='2017-06-01 10:00:00.0 UTC',
+                             creation='2017-06-01 10:00:00.0 UTC', description='Synthetic project')
+        children = etree.SubElement(root, 'children')
+        for i in range(self.sizes['module_breadth']):
+            is_project = depth > 1 and i < 2
+            name = '{0}-{1}'.format('project' if is_project else 'component', i)
+            child_path = '{0}/{1}'.format(path, name) if path else name
+            etree.SubElement(children, 'item', name=name, category='Project' if is_project else 'Image',
+                             version='1', resourceUri='module/{0}/1'.format(child_path))
+            if is_project:
+                self._module_tree(rnd, 'module/' + path, child_path, depth - 1)
+            else:
+                self.modules[child_path] = self._component(rnd, 'module/' + path, name)
+        self.modules[path] = _xml(root)
+
+    @staticmethod
+    def _component(rnd, parent_uri, name):
+        root = etree.Element('imageModule', parentUri=parent_uri, shortName=name, category='Image', version='1',
+                             lastModified='2017-06-01 10:00:00.0 UTC', creation='2017-06-01 10:00:00.0 UTC',
+                             description='Synthetic component', isBase='true', moduleReferenceUri='')
+        ids = etree.SubElement(root, 'cloudImageIdentifiers')
+        for cloud in CLOUDS:
+            etree.SubElement(ids, 'cloudImageIdentifier', cloudServiceName=cloud,
+                             cloudImageIdentifier='img-{0:x}'.format(rnd.getrandbits(32)))
+        params = etree.SubElement(root, 'parameters')
+        for j in range(20):
+            entry = etree.SubElement(params, 'entry')
+            etree.SubElement(entry, 'string').text = 'param-{0}'.format(j)
+            param = etree.SubElement(entry, 'parameter', name='param-{0}'.format(j), category='Input',
+                                     type='String', mandatory='false', readonly='false', isSet='true')
+            etree.SubElement(param, 'value').text = 'value-{0}'.format(j)
+        return _xml(root)
+
+    def _appstore(self, rnd):
+        root = etree.Element('list')
+        for i in range(self.sizes['appstore']):
+            etree.SubElement(root, 'item', name='app-{0}'.format(i), category=rnd.choice(['Image', 'Deployment']),
+                             version=str(rnd.randint(1, 100)), resourceUri='module/apps/app-{0}/1'.format(i))
+        return _xml(root)
+
+    def _dashboard(self, rnd):
+        root = etree.Element('dashboard')
+        usages = etree.SubElement(root, 'cloudUsages')
+        for cloud in CLOUDS:
+            etree.SubElement(usages, 'cloudUsage', cloud=cloud, vmQuota=str(rnd.randint(20, 100)),
+                             userRunUsage=str(rnd.randint(0, 10)), userVmUsage=str(rnd.randint(0, 20)),
+                             userInactiveVmUsage='0', othersVmUsage=str(rnd.randint(0, 50)),
+                             pendingVmUsage=str(rnd.randint(0, 5)), unknownVmUsage='0')
+        return _xml(root)
+
+    def _user(self, rnd):
+        root = etree.Element('user', name='user', email='user@example.com', firstName='First', lastName='Last',
+                             issuper='false', state='ACTIVE')
+        params = etree.SubElement(root, 'parameters')
+        for i in range(self.sizes['user_parameters']):
+            cloud = CLOUDS[i % len(CLOUDS)]
+            name = '{0}.param-{1}'.format(cloud, i)
+            entry = etree.SubElement(params, 'entry')
+            etree.SubElement(entry, 'string').text = name
+            param = etree.SubElement(entry, 'parameter', name=name, category=cloud)
+            etree.SubElement(param, 'value').text = 'x' * rnd.randint(5, 50)
+        return _xml(root)
+
+    def _cimi_collection(self, rnd, collection, resource_type):
+        return cimi_resources(rnd, collection, self.sizes['cimi'], self.run_ids)
+
+
+class FakeSlipStreamServer(object):
+    """Threaded HTTP server answering like a SlipStream server.
+
+    :param latency: Delay (in seconds) added to each response.
+    :param sizes: Number of runs, vms, cimi resources, ... (see DEFAULT_SIZES).
+    """
+
+    def __init__(self, latency=0.0, host='127.0.0.1', port=0, **sizes):
+        self.latency = latency
+        self.address = (host, port)
+        self.documents = Documents(**sizes)
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def endpoint(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{0}:{1}'.format(host, port)
+
+    def start(self):
+        handler = _make_handler(self)
+
+        class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+            request_queue_size = 128
+
+        self._server = Server(self.address, handler)
+        thread = threading.Thread(target=self._server.serve_forever, name='fake-slipstream')
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+_version_re = re.compile('/[0-9]+$')
+
+
+def _make_handler(server):
+    documents = server.documents
+
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are written separately: avoid the delayed ACK stalls
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, body=b'', content_type='application/xml', headers=None):
+            if server.latency:
+                time.sleep(server.latency)
+            with server._lock:
+                server.request_count += 1
+            if not isinstance(body, bytes):
+                body = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _json(self, status, data):
+            self._reply(status, json.dumps(data), 'application/json')
+
+        def _read_body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return self.rfile.read(length) if length else b''
+
+        def do_GET(self):
+            path = urlparse(self.path).path.rstrip('/')
+            parts = path.strip('/').split('/')
+            if path == '/run':
+                return self._reply(200, documents.runs)
+            if parts[0] == 'run' and len(parts) == 2:
+                doc = documents.run_docs.get(parts[1]) or documents.run_docs[documents.run_ids[0]]
+                return self._reply(200, doc)
+            if parts[0] == 'run' and len(parts) == 3:
+                return self._reply(200, 'Ready', 'text/plain')
+            if path == '/vms':
+                return self._reply(200, documents.vms)
+            if path == '/appstore':
+                return self._reply(200, documents.appstore)
+            if path == '/dashboard':
+                return self._reply(200, documents.dashboard)
+            if parts[0] == 'user':
+                return self._reply(200, documents.user)
+            if parts[0] == 'module':
+                module_path = _version_re.sub('', '/'.join(parts[1:]))
+                doc = documents.modules.get(module_path)
+                if doc is None:
+                    return self._reply(404)
+                return self._reply(200, doc)
+            if path == '/api/cloud-entry-point':
+                entry_points = dict((resource_type, {'href': collection})
+                                    for collection, resource_type in (('event', 'events'),
+                                                                      ('credential', 'credentials'),
+                                                                      ('session', 'sessions')))
+                entry_points.update(id='cloud-entry-point', resourceURI='http://sixsq.com/slipstream/1/CloudEntryPoint')
+                return self._json(200, entry_points)
+            return self._reply(404)
+
+        def do_PUT(self):
+            path = urlparse(self.path).path.rstrip('/')
+            parts = path.strip('/').split('/')
+            self._read_body()
+            if parts[0] == 'api' and len(parts) == 2 and parts[1] in documents.cimi:
+                resources = documents.cimi[parts[1]]
+                resource_type = {'event': 'events', 'credential': 'credentials', 'session': 'sessions'}[parts[1]]
+                return self._json(200, {'count': len(resources),
+                                        'resourceURI': 'http://sixsq.com/slipstream/1/Collection',
+                                        'operations': [{'rel': 'add', 'href': parts[1]}],
+                                        resource_type: resources})
+            if parts[0] in ('user', 'module'):
+                return self._reply(200)
+            return self._reply(404)
+
+        def do_POST(self):
+            path = urlparse(self.path).path.rstrip('/')
+            self._read_body()
+            if path == '/run':
+                return self._reply(201, headers={'Location': '{0}/run/{1}'.format(server.endpoint,
+                                                                                  uuid.uuid4())})
+            if path == '/api/session':
+                return self._json(201, {'status': 201, 'resource-id': 'session/' + str(uuid.uuid4())},)
+            return self._reply(404)
+
+        def do_DELETE(self):
+            self._read_body()
+            return self._reply(204)
+
+    return Handler
+
+
+if __name__ == '__main__':
+    with FakeSlipStreamServer() as fake:
+        print('Fake SlipStream server listening on {0}'.format(fake.endpoint))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Offline benchmarks of the SlipStream Python API against a local fake server.
+
+ Measure the latency, throughput and peak memory of the main Api methods and
+ store the results as JSON, to compare them between versions::
+
+    $ python benchmarks/run_benchmarks.py --output before.json
+    $ python benchmarks/run_benchmarks.py --output after.json --compare before.json
+
+"""
+
+from __future__ import absolute_import, print_function
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import collections
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from slipstream.api import Api  # noqa: E402
+from slipstream.api.instrumentation import percentile  # noqa: E402
+
+from fake_server import FakeSlipStreamServer, CLOUDS  # noqa: E402
+
+SCENARIOS = collections.OrderedDict()
+
+
+def scenario(func):
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+@scenario
+def list_virtualmachines(api, documents):
+    return len(list(api.list_virtualmachines(limit=documents.sizes['vms'])))
+
+
+@scenario
+def list_deployments(api, documents):
+    return len(list(api.list_deployments(limit=documents.sizes['runs'])))
+
+
+@scenario
+def get_deployment(api, documents):
+    api.get_deployment(documents.run_ids[0])
+    return 1
+
+
+@scenario
+def list_project_content_recurse(api, documents):
+    return len(list(api.list_project_content(recurse=True)))
+
+
+@scenario
+def list_applications(api, documents):
+    return len(list(api.list_applications()))
+
+
+@scenario
+def cimi_search(api, documents):
+    return len(api.cimi_search('events').resources_list)
+
+
+@scenario
+def cimi_search_stream(api, documents):
+    return sum(1 for _ in api.cimi_search('events', stream=True))
+
+
+@scenario
+def get_user(api, documents):
+    api.get_user('user')
+    return 1
+
+
+@scenario
+def update_user(api, documents):
+    api.update_user('user', email='user@example.org', default_cloud=CLOUDS[0])
+    return 1
+
+
+@scenario
+def deploy(api, documents):
+    api.deploy('apps/app-1', cloud=CLOUDS[0], parameters={'node': {'param-1': 'value'}})
+    return 1
+
+
+@scenario
+def usage(api, documents):
+    return len(list(api.usage()))
+
+
+def _measure(func, api, documents, iterations, warmup):
+    for _ in range(warmup):
+        func(api, documents)
+
+    latencies = []
+    items = 0
+    start = time.time()
+    for _ in range(iterations):
+        t = time.time()
+        items += func(api, documents)
+        latencies.append(time.time() - t)
+    total = time.time() - start
+
+    peak_memory = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        func(api, documents)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    latencies.sort()
+    return collections.OrderedDict([
+        ('iterations', iterations),
+        ('items_per_iteration', items // iterations if iterations else 0),
+        ('total_time', total),
+        ('throughput', iterations / total if total else None),
+        ('items_throughput', items / total if total else None),
+        ('latency', collections.OrderedDict([
+            ('mean', sum(latencies) / len(latencies)),
+            ('p50', percentile(latencies, 50)),
+            ('p95', percentile(latencies, 95)),
+            ('p99', percentile(latencies, 99)),
+            ('max', latencies[-1]),
+        ])),
+        ('peak_memory_bytes', peak_memory),
+    ])
+
+
+def _version():
+    try:
+        import pkg_resources
+        return pkg_resources.get_distribution('slipstream-api').version
+    except Exception:
+        return None
+
+
+def run(scenarios, iterations, warmup, latency, sizes, label=None):
+    results = collections.OrderedDict()
+    with FakeSlipStreamServer(latency=latency, **sizes) as fake:
+        cookie_file = os.path.join(tempfile.mkdtemp(prefix='slipstream-bench-'), 'cookies.txt')
+        api = Api(fake.endpoint, cookie_file=cookie_file)
+        for name in scenarios:
+            print('Running {0}...'.format(name), file=sys.stderr)
+            results[name] = _measure(SCENARIOS[name], api, fake.documents, iterations, warmup)
+        config = dict(iterations=iterations, warmup=warmup, latency=latency, sizes=fake.documents.sizes)
+
+    return collections.OrderedDict([
+        ('label', label),
+        ('version', _version()),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('timestamp', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())),
+        ('config', config),
+        ('results', results),
+    ])
+
+
+def compare(current, baseline, threshold):
+    """Print the relative change of the p50 latency and peak memory of each
+    scenario and return the list of the scenarios which regressed by more
+    than 'threshold' (ratio)."""
+    regressions = []
+    print('{0:32}{1:>14}{2:>14}{3:>10}{4:>10}'.format('scenario', 'p50 before', 'p50 after', 'change', 'memory'))
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        p50_before, p50_after = before['latency']['p50'], result['latency']['p50']
+        change = (p50_after - p50_before) / p50_before if p50_before else 0
+        memory_change = ''
+        if before.get('peak_memory_bytes') and result.get('peak_memory_bytes'):
+            ratio = float(result['peak_memory_bytes']) / before['peak_memory_bytes'] - 1
+            memory_change = '{0:+.1%}'.format(ratio)
+            if ratio > threshold:
+                regressions.append(name)
+        if change > threshold and name not in regressions:
+            regressions.append(name)
+        print('{0:32}{1:>12.2f}ms{2:>12.2f}ms{3:>+10.1%}{4:>10}'.format(name, p50_before * 1000, p50_after * 1000,
+                                                                       change, memory_change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS.keys()),
+                        help='Scenario to run (can be repeated). Default to all.')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.0, help='Latency (in seconds) of the fake server.')
+    parser.add_argument('--runs', type=int, default=500, help='Number of deployments.')
+    parser.add_argument('--vms', type=int, default=2000, help='Number of virtual machines.')
+    parser.add_argument('--cimi', type=int, default=1000, help='Number of resources per CIMI collection.')
+    parser.add_argument('--module-breadth', type=int, default=5, help='Number of modules per project.')
+    parser.add_argument('--module-depth', type=int, default=3, help='Depth of the project tree.')
+    parser.add_argument('--user-parameters', type=int, default=200, help='Number of parameters of the user.')
+    parser.add_argument('--label', help='Label stored with the results (e.g. a version or commit).')
+    parser.add_argument('--output', help='Write the results as JSON in this file.')
+    parser.add_argument('--compare', help='JSON results to compare with.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative slow down considered as a regression (default: 0.1).')
+    args = parser.parse_args(argv)
+
+    sizes = dict(runs=args.runs, vms=args.vms, cimi=args.cimi, module_breadth=args.module_breadth,
+                 module_depth=args.module_depth, user_parameters=args.user_parameters)
+    results = run(args.scenario or list(SCENARIOS.keys()), args.iterations, args.warmup, args.latency, sizes,
+                  args.label)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print('Regressions: {0}'.format(', '.join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
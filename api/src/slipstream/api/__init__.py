@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
 
-from .api import Api, SlipStreamError, ConnectionError
-
+from .api import Api, SlipStreamError, CircuitOpenError, DeadlineExceededError, ConnectionError
+from .breaker import CircuitBreaker
+from .retry import RetryPolicy
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Totals of the virtual machines inventory::
+
+    from slipstream.api import Api
+    from slipstream.api.aggregation import Inventory, quota_status
+
+    api = Api()
+    inventory = Inventory.from_api(api)
+
+    for cloud, totals in inventory.by_cloud().items():
+        print(cloud, totals['count'], totals['cpu'], totals['ram'], totals['disk'])
+
+    # Sums per (deployment, node) of the running VMs only
+    inventory.group_by(('deployment_id', 'node_name'), where={'status': ['running']})
+
+    for status in quota_status(api.usage(), inventory):
+        if status.over:
+            print(status.cloud, 'is over quota by', -status.available)
+
+ The inventory is stored by column: the numeric fields (cpu, ram, disk) are
+ parsed once and the grouping fields are encoded as integer codes, so that
+ a group-by is a single pass (NumPy's bincount when NumPy is installed).
+"""
+
+from __future__ import absolute_import
+
+import logging
+import collections
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_FIELDS = ('cpu', 'ram', 'disk')
+KEY_FIELDS = ('cloud', 'status', 'deployment_id', 'deployment_owner', 'node_name', 'instance_type', 'is_usable')
+
+# Statuses (lower case, as in models.VirtualMachine) of the VMs counted in the quota
+ACTIVE_STATES = ('running', 'pending', 'booting', 'active', 'rebooting')
+ACTIVE_VMS = {'status': ACTIVE_STATES}
+
+NAN = float('nan')
+
+QuotaStatus = collections.namedtuple('QuotaStatus', ['cloud', 'quota', 'used', 'pending', 'inventory',
+                                                     'available', 'over'])
+
+
+def parse_number(value):
+    """float of a numeric field of the API ('2', '2048', '10.5'), NaN if missing or invalid."""
+    if value is None:
+        return NAN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+class Inventory(object):
+    """Columnar table of virtual machines.
+
+    :param vms: The virtual machines (models.VirtualMachine).
+    :type vms: iterable
+    :param use_numpy: Use NumPy. Default to True if it is installed.
+    """
+
+    def __init__(self, vms, use_numpy=None):
+        self.use_numpy = numpy is not None if use_numpy is None else use_numpy
+        if self.use_numpy and numpy is None:
+            raise ValueError('NumPy is not installed')
+        keys = dict((field, []) for field in KEY_FIELDS)
+        numbers = dict((field, []) for field in NUMERIC_FIELDS)
+        for vm in vms:
+            for field in KEY_FIELDS:
+                keys[field].append(getattr(vm, field))
+            for field in NUMERIC_FIELDS:
+                numbers[field].append(parse_number(getattr(vm, field)))
+        self._keys = keys
+        self._size = len(keys['cloud'])
+        if self.use_numpy:
+            self._numbers = dict((field, numpy.array(values, dtype=float)) for field, values in numbers.items())
+        else:
+            self._numbers = numbers
+        self._factors = {}
+
+    @classmethod
+    def from_api(cls, api, deployment_id=None, cloud=None, page_size=500, use_numpy=None):
+        """Inventory of all the virtual machines (paging through list_virtualmachines)."""
+        vms = []
+        offset = 0
+        while True:
+            page = list(api.list_virtualmachines(deployment_id=deployment_id, cloud=cloud, offset=offset,
+                                                 limit=page_size))
+            vms.extend(page)
+            # A server ignoring 'limit' returns everything at once
+            if len(page) != page_size:
+                break
+            offset += page_size
+        return cls(vms, use_numpy)
+
+    def __len__(self):
+        return self._size
+
+    def column(self, field):
+        """The values of a field (floats for the numeric fields)."""
+        if field in self._numbers:
+            return self._numbers[field]
+        return self._keys[field]
+
+    def _factorize(self, field):
+        """(integer code of each row, distinct values) of a grouping field."""
+        factor = self._factors.get(field)
+        if factor is None:
+            index = {}
+            codes = [index.setdefault(value, len(index)) for value in self._keys[field]]
+            labels = [None] * len(index)
+            for value, code in index.items():
+                labels[code] = value
+            if self.use_numpy:
+                codes = numpy.array(codes, dtype=numpy.int64)
+            factor = self._factors[field] = (codes, labels)
+        return factor
+
+    @staticmethod
+    def _allowed(values):
+        # A single value (e.g. 'running') is not a list of values: 'in' would match substrings
+        if isinstance(values, (list, tuple, set, frozenset)):
+            return values
+        return [values]
+
+    def _mask(self, where):
+        """Rows selected by 'where' (dict of field: allowed value(s)), None for all."""
+        if not where:
+            return None
+        where = dict((field, self._allowed(values)) for field, values in where.items())
+        if self.use_numpy:
+            mask = numpy.ones(self._size, dtype=bool)
+            for field, values in where.items():
+                codes, labels = self._factorize(field)
+                allowed = [code for code, label in enumerate(labels) if label in values]
+                mask &= numpy.isin(codes, allowed)
+            return mask
+        mask = [True] * self._size
+        for field, values in where.items():
+            values = set(values)
+            mask = [m and v in values for m, v in zip(mask, self._keys[field])]
+        return mask
+
+    def group_by(self, keys, fields=NUMERIC_FIELDS, where=None):
+        """Number of VMs and sums of the numeric fields per value of the grouping field(s).
+
+        The missing or invalid numeric values are not summed.
+
+        :param keys: A grouping field or a tuple of grouping fields (see KEY_FIELDS).
+        :param fields: The numeric fields to sum.
+        :param where: Only the rows whose values are in the given lists (or equal to the given
+                      values), e.g. {'status': ['running']}.
+
+        :return: dict of group (value or tuple of values) to dict of 'count' and the sums
+        :rtype: dict
+        """
+        single = not isinstance(keys, (tuple, list))
+        keys = (keys,) if single else tuple(keys)
+        factors = [self._factorize(key) for key in keys]
+        mask = self._mask(where)
+        if self.use_numpy:
+            groups = self._group_by_numpy(factors, fields, mask)
+        else:
+            groups = self._group_by_python(factors, fields, mask)
+        if single:
+            return dict((group[0], totals) for group, totals in groups.items())
+        return groups
+
+    def _group_by_numpy(self, factors, fields, mask):
+        combined = numpy.zeros(self._size, dtype=numpy.int64)
+        for codes, labels in factors:
+            combined = combined * len(labels) + codes
+        if mask is not None:
+            combined = combined[mask]
+        uniques, inverse = numpy.unique(combined, return_inverse=True)
+        counts = numpy.bincount(inverse, minlength=len(uniques))
+        sums = {}
+        for field in fields:
+            values = self._numbers[field]
+            if mask is not None:
+                values = values[mask]
+            sums[field] = numpy.bincount(inverse, weights=numpy.nan_to_num(values), minlength=len(uniques))
+
+        # Decode the combined codes
+        group_labels = [[] for _ in range(len(uniques))]
+        remainder = uniques.copy()
+        for codes, labels in reversed(factors):
+            for i, code in enumerate(remainder % len(labels)):
+                group_labels[i].append(labels[code])
+            remainder //= len(labels)
+
+        groups = {}
+        for i, labels in enumerate(group_labels):
+            totals = dict((field, float(sums[field][i])) for field in fields)
+            totals['count'] = int(counts[i])
+            groups[tuple(reversed(labels))] = totals
+        return groups
+
+    def _group_by_python(self, factors, fields, mask):
+        labels = [f[1] for f in factors]
+        columns = [self._numbers[field] for field in fields]
+        rows = zip(*[f[0] for f in factors])
+        groups = {}
+        for i, codes in enumerate(rows):
+            if mask is not None and not mask[i]:
+                continue
+            totals = groups.get(codes)
+            if totals is None:
+                totals = groups[codes] = [0] + [0.0] * len(fields)
+            totals[0] += 1
+            for j, column in enumerate(columns):
+                value = column[i]
+                if value == value:  # not NaN
+                    totals[j + 1] += value
+        return dict((tuple(labels[k][code] for k, code in enumerate(codes)),
+                     dict(zip(('count',) + tuple(fields), totals)))
+                    for codes, totals in groups.items())
+
+    def totals(self, fields=NUMERIC_FIELDS, where=None):
+        """Number of VMs and sums of the numeric fields of the whole inventory."""
+        mask = self._mask(where)
+        if self.use_numpy:
+            totals = dict((field, float(numpy.nansum(self._numbers[field] if mask is None
+                                                     else self._numbers[field][mask]))) for field in fields)
+            totals['count'] = self._size if mask is None else int(mask.sum())
+            return totals
+        totals = dict((field, sum((v for i, v in enumerate(self._numbers[field])
+                                   if v == v and (mask is None or mask[i])), 0.0)) for field in fields)
+        totals['count'] = self._size if mask is None else sum(mask)
+        return totals
+
+    def by_cloud(self, **kwargs):
+        return self.group_by('cloud', **kwargs)
+
+    def by_user(self, **kwargs):
+        return self.group_by('deployment_owner', **kwargs)
+
+    def by_node(self, **kwargs):
+        """Totals per (deployment_id, node_name)."""
+        return self.group_by(('deployment_id', 'node_name'), **kwargs)
+
+
+def quota_status(usages, inventory=None, where=ACTIVE_VMS):
+    """Compare the usage of each cloud to its quota.
+
+    :param usages: The usage of the clouds (models.Usage, as returned by Api.usage()).
+    :param inventory: An Inventory of the VMs of the user. Its number of VMs per cloud
+                      is used when it is higher than the usage reported by the server.
+    :param where: Rows of the inventory to count (see Inventory.group_by). Default to the
+                  VMs whose status is one of ACTIVE_STATES (ACTIVE_VMS), None to count them all.
+
+    :return: The status of each cloud. 'available' is the number of VMs which can still
+             be started (negative when 'over' the quota).
+    :rtype: list of QuotaStatus
+    """
+    counts = {}
+    if inventory is not None:
+        counts = dict((cloud, totals['count']) for cloud, totals in
+                      inventory.group_by('cloud', fields=(), where=where).items())
+    statuses = []
+    for usage in usages:
+        counted = counts.get(usage.cloud, 0)
+        used = max(usage.vm_usage, counted)
+        available = usage.quota - used - usage.pending_vm_usage
+        statuses.append(QuotaStatus(usage.cloud, usage.quota, usage.vm_usage, usage.pending_vm_usage, counted,
+                                    available, available < 0))
+    return statuses
@@ -121,6 +121,43 @@
 
     api.terminate(deployment_id)
 
+
+ Retry transient failures
+ ~~~~~~~~~~~~~~~~~~~~~~~~
+ ::
+
+    from slipstream.api import Api, RetryPolicy
+
+    # Retry idempotent requests failing with 429, 502, 503 or 504
+    api = Api(retry=RetryPolicy(max_attempts=5, backoff_factor=1))
+
+    # Override the policy for some calls only
+    with api.call_options(retry=RetryPolicy(max_attempts=10)):
+        vms = list(api.list_virtualmachines(limit=1000))
+
+
+ Profile the calls
+ ~~~~~~~~~~~~~~~~~
+ ::
+
+    # Wall clock and CPU time per phase (network, decode, parse, model, ...)
+    with api.profile('profile.txt'):
+        deployments = list(api.list_deployments(limit=1000))
+
+
+ Count and aggregate on the server
+ ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+ ::
+
+    # No resource is downloaded
+    api.cimi_count('events', filter="type='state'")
+    api.cimi_terms('events', 'type')   # [TermsBucket(key='state', count=42), ...]
+    api.cimi_sum('quotas', 'limit')
+
+    # Only download the attributes used
+    for event in api.cimi_search('events', fields=['timestamp', 'content']):
+        print(event.timestamp, event.content)
+
     
  API documentation
  -----------------
@@ -131,19 +168,36 @@ from __future__ import absolute_import
 
 import os
 import six
+import codecs
+import hashlib
 import stat
+import time
 import uuid
 import logging
+import inspect
+import functools
+import threading
+
+from contextlib import contextmanager
 
 import requests
 from requests.cookies import MockRequest
-from requests.exceptions import HTTPError, ConnectionError
+from requests.exceptions import HTTPError, ConnectionError, Timeout
 
 from six import string_types, integer_types
 from six.moves.urllib.parse import urlparse
 from six.moves.http_cookiejar import MozillaCookieJar
 
 from . import models
+from .retry import RetryStats
+from .compression import ACCEPT_ENCODING, DEFAULT_MIN_SIZE, TransferStats, body_size, compress_request_body, \
+    wire_size
+from .instrumentation import Instrumentation, RequestEvent, url_template
+from .tracing import Tracer
+from .profiling import Profiler, NULL_PHASE, cpu_time
+from .cache import cache_key
+from .throttle import READ, DEPLOY, request_class_for_method
+from .query import Field, Filter
 
 try:
     from xml.etree import cElementTree as etree
@@ -181,8 +235,155 @@ def get_module_type(category):
 
 
 def element_tree__iter(root):
-    return getattr(root, 'iter',  # Python 2.7 and above
-                   root.getiterator)  # Python 2.6 compatibility
+    iter_ = getattr(root, 'iter', None)  # Python 2.7 and above
+    if iter_ is None:
+        iter_ = root.getiterator  # Python 2.6 compatibility
+    return iter_
+
+
+def content_charset(response):
+    """The charset given explicitly in the Content-Type of 'response' (normalized
+    codec name), or None."""
+    content_type = response.headers.get('Content-Type', '')
+    for param in content_type.split(';')[1:]:
+        key, _, value = param.partition('=')
+        if key.strip().lower() == 'charset':
+            try:
+                return codecs.lookup(value.strip().strip('"\'')).name
+            except LookupError:
+                logger.debug("Unknown charset '{0}' in Content-Type.".format(value))
+                return None
+    return None
+
+
+def deployment_events_filter(deployment_id, types=None):
+    """CIMI filter selecting the events of a deployment (of the given types)."""
+    filter = Field('content/resource/href') == 'run/{0}'.format(deployment_id)
+    if types:
+        filter &= Field('type').any_of(types)
+    return str(filter)
+
+
+def cimi_select(fields):
+    """CIMI 'select' of the attributes 'fields' (and 'id', always needed)."""
+    if isinstance(fields, six.string_types):
+        fields = fields.split(',')
+    selected = ['id']
+    for field in fields:
+        field = field.strip()
+        if field and field not in selected:
+            selected.append(field)
+    return ','.join(selected)
+
+
+def _parse_node_instances(root):
+    """Instance ids of each node of a run document. The '<node>:ids' runtime
+    parameter is used when present, else the '<node>.<id>:*' parameters."""
+    found = {}
+    declared = {}
+    for parameter in root.iterfind('runtimeParameters/entry/runtimeParameter'):
+        name, _, key = parameter.get('key', '').partition(':')
+        if not key:
+            continue
+        node, dot, index = name.rpartition('.')
+        if dot and index.isdigit():
+            found.setdefault(node, set()).add(int(index))
+        elif key == 'ids':
+            declared[name] = set(int(i) for i in (parameter.text or '').split(',') if i.strip().isdigit())
+    found.update(declared)
+    return dict((node, sorted(ids)) for node, ids in found.items())
+
+
+def _operation(family):
+    """Decorator declaring a public Api method and its operation family.
+
+    The name of the method and its family are available as the call options
+    'operation' and 'family' to the requests done by the method (e.g. to select
+    the timeout). The call is traced as a span parent of the spans of its
+    requests, and a CallEvent is sent to the instrumentation hooks at the end
+    of the call. For generators the options are only set (and the span only
+    current) while the generator is running, never while the caller is
+    processing a yielded item. Without instrumentation hooks, tracing nor
+    profiling, a generator only pushes and pops its options around each item.
+    """
+    def decorator(func):
+        name = func.__name__
+        span_name = 'slipstream.api.' + name
+        span_attributes = {'slipstream.family': family}
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def wrapper(self, *args, **kwargs):
+                session = self.session
+                call = self.instrumentation.start_call(name, family)
+                span = self.tracer.start_span(span_name, span_attributes)
+                generator = func(self, *args, **kwargs)
+
+                if call is None and span is None and session.profiler is None:
+                    options = {'operation': name, 'family': family}
+                    while True:
+                        stack = session._options_stack()
+                        stack.append(options)
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            return
+                        finally:
+                            stack.pop()
+                        yield item
+
+                error = None
+                first = True
+                try:
+                    while True:
+                        start = time.time()
+                        profiler = session.profiler
+                        try:
+                            with self.tracer.activate(span):
+                                with session.call_options(operation=name, family=family, call=call):
+                                    with (profiler.call(name, first) if profiler is not None else NULL_PHASE):
+                                        first = False
+                                        try:
+                                            item = next(generator)
+                                        except StopIteration:
+                                            return
+                        finally:
+                            if call is not None:
+                                call.duration += time.time() - start
+                        yielded, yielded_cpu = time.time(), cpu_time()
+                        yield item
+                        if profiler is not None:
+                            profiler.iteration(name, time.time() - yielded, cpu_time() - yielded_cpu)
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    self.tracer.end_span(span, error)
+                    if call is not None:
+                        call.error = error
+                        self.instrumentation.emit(call.to_event())
+        else:
+            @functools.wraps(func)
+            def wrapper(self, *args, **kwargs):
+                call = self.instrumentation.start_call(name, family)
+                session = self.session
+                profiler = session.profiler
+                try:
+                    with self.tracer.span(span_name, span_attributes):
+                        with session.call_options(operation=name, family=family, call=call):
+                            with (profiler.call(name) if profiler is not None else NULL_PHASE):
+                                return func(self, *args, **kwargs)
+                except Exception as e:
+                    if call is not None:
+                        call.error = e
+                    raise
+                finally:
+                    if call is not None:
+                        call.duration = time.time() - call.start
+                        self.instrumentation.emit(call.to_event())
+
+        return wrapper
+    return decorator
 
 
 class SlipStreamError(Exception):
@@ -192,14 +393,45 @@ class SlipStreamError(Exception):
         self.response = response
 
 
+class CircuitOpenError(SlipStreamError):
+    """Raised without contacting the server when the circuit breaker is open."""
+
+    def __init__(self, reason, retry_in=None):
+        super(CircuitOpenError, self).__init__(reason)
+        self.retry_in = retry_in
+
+
+class DeadlineExceededError(SlipStreamError):
+    """Raised when the deadline of an operation is reached, before a request is sent or
+    while waiting for its response (the requests.Timeout is then the cause)."""
+    pass
+
+
 class SessionStore(requests.Session):
     """A ``requests.Session`` subclass implementing a file-based session store."""
 
-    def __init__(self, endpoint, reauthenticate, cookie_file=None, login_params=None):
+    def __init__(self, endpoint, reauthenticate, cookie_file=None, login_params=None, retry=None,
+                 throttle=None, breaker=None, timeouts=None, compress_requests=False,
+                 compress_min_size=DEFAULT_MIN_SIZE, instrumentation=None, tracer=None):
         super(SessionStore, self).__init__()
         self.session_base_url = '{0}/api/session'.format(endpoint)
         self.reauthenticate = reauthenticate
         self.login_params = login_params
+        self.retry = retry
+        self.retry_stats = RetryStats()
+        self.throttle = throttle
+        self.breaker = breaker
+        self.timeouts = timeouts or {}
+        self.compress_requests = compress_requests
+        self.compress_min_size = compress_min_size
+        self.transfer_stats = TransferStats()
+        self.instrumentation = instrumentation or Instrumentation()
+        self.tracer = tracer or Tracer()
+        self.reauthentications = 0
+        self.failed_reauthentications = 0
+        self.profiler = None
+        self.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        self._local = threading.local()
         if cookie_file is None:
             cookie_file = DEFAULT_COOKIE_FILE
         cookie_dir = os.path.dirname(cookie_file)
@@ -215,12 +447,201 @@ class SessionStore(requests.Session):
     def need_to_login(self, accessed_url, status_code):
         return self.reauthenticate and status_code in [401, 403] and accessed_url != self.session_base_url
 
-    def _request(self, *args, **kwargs):
-        kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
-        return super(SessionStore, self).request(*args, **kwargs)
+    def _options_stack(self):
+        stack = getattr(self._local, 'options', None)
+        if stack is None:
+            stack = self._local.options = []
+        return stack
+
+    @contextmanager
+    def call_options(self, **options):
+        """Override options (e.g. 'retry') for the requests done by the current
+        thread inside the 'with' block."""
+        deadline = options.pop('deadline', None)
+        if deadline is not None:
+            options['deadline_at'] = time.time() + deadline
+        stack = self._options_stack()
+        stack.append(options)
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    def get_call_option(self, name, default=None):
+        for options in reversed(self._options_stack()):
+            if name in options:
+                return options[name]
+        return default
+
+    def _call_records(self):
+        return [o['call'] for o in self._options_stack() if o.get('call') is not None]
+
+    def record_phase(self, phase, seconds):
+        """Add 'seconds' to the time spent in 'phase' (e.g. 'parse') by the current Api calls."""
+        for call in self._call_records():
+            call.add_phase(phase, seconds)
+
+    def profiling(self, phase):
+        """Context manager measuring the 'with' block as 'phase' in the profiler, if any."""
+        profiler = self.profiler
+        if profiler is None:
+            return NULL_PHASE
+        return profiler.phase(phase, self.get_call_option('operation'))
+
+    @contextmanager
+    def phase(self, phase, **attributes):
+        """Measure (and trace) the 'with' block as the phase 'phase' of the current Api calls."""
+        start = time.time()
+        try:
+            with self.tracer.span('slipstream.' + phase, attributes or None):
+                with self.profiling(phase):
+                    yield
+        finally:
+            self.record_phase(phase, time.time() - start)
+
+    def _emit_request_event(self, method, url, response, error, network_time):
+        event = RequestEvent(operation=self.get_call_option('operation'),
+                             method=method.upper(),
+                             url_template=url_template(url),
+                             status=response.status_code if response is not None else None,
+                             bytes_sent=body_size(response.request) if response is not None else 0,
+                             bytes_received=wire_size(response) if response is not None else 0,
+                             network_time=network_time,
+                             retries=getattr(response, 'retries', 0),
+                             error=error)
+        for call in self._call_records():
+            call.add_request(event)
+        self.instrumentation.emit(event)
+
+    def _timeout(self):
+        timeout = self.get_call_option('timeout')
+        if timeout is None:
+            family = self.get_call_option('family')
+            timeout = self.timeouts.get(family, self.timeouts.get('default', DEFAULT_TIMEOUT))
+        return timeout
+
+    def _deadline(self):
+        deadlines = [o['deadline_at'] for o in self._options_stack() if o.get('deadline_at') is not None]
+        return min(deadlines) if deadlines else None
+
+    @staticmethod
+    def _bounded_timeout(timeout, remaining):
+        if isinstance(timeout, tuple):
+            return tuple(remaining if t is None else min(t, remaining) for t in timeout)
+        return remaining if timeout is None else min(timeout, remaining)
+
+    @staticmethod
+    def _retry_delay(retry, retryable, attempt, deadline, response=None):
+        if not retryable:
+            return None
+        delay = retry.delay(attempt, response)
+        if deadline is not None and time.time() + delay >= deadline:
+            return None
+        return delay
+
+    def _request(self, method, url, *args, **kwargs):
+        timeout = kwargs.pop('timeout', None)
+        if timeout is None:
+            timeout = self._timeout()
+        deadline = self._deadline()
+        retry = self.get_call_option('retry', self.retry) or None
+        request_class = self.get_call_option('request_class') or request_class_for_method(method)
+        attempt = 1
+        while True:
+            kwargs['timeout'] = timeout
+            capped = False
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise DeadlineExceededError('Deadline exceeded before {0} {1}'.format(method, url))
+                kwargs['timeout'] = self._bounded_timeout(timeout, remaining)
+                capped = kwargs['timeout'] != timeout
+            can_retry = retry is not None and retry.can_retry(method, attempt)
+            try:
+                response = self._send(request_class, method, url, *args, **kwargs)
+            except (ConnectionError, Timeout) as e:
+                delay = self._retry_delay(retry, can_retry and retry.retry_on_connection_errors, attempt, deadline)
+                if delay is None:
+                    self.retry_stats.record(attempt - 1, exhausted=attempt > 1)
+                    if capped and isinstance(e, Timeout):
+                        six.raise_from(DeadlineExceededError('Deadline exceeded during {0} {1}'.format(method, url)),
+                                       e)
+                    raise
+                logger.debug("{0} {1} failed ({2}). Retrying in {3:.2f}s.".format(method, url, e, delay))
+            else:
+                delay = self._retry_delay(retry, can_retry and retry.is_retryable_response(response), attempt,
+                                          deadline, response)
+                if delay is None:
+                    exhausted = attempt > 1 and retry.is_retryable_response(response)
+                    self.retry_stats.record(attempt - 1, exhausted=exhausted)
+                    response.retries = attempt - 1
+                    return response
+                logger.debug("{0} {1} returned {2}. Retrying in {3:.2f}s."
+                             .format(method, url, response.status_code, delay))
+                response.close()
+            with self.profiling('backoff'):
+                time.sleep(delay)
+            attempt += 1
+
+    def _send(self, request_class, method, url, *args, **kwargs):
+        breaker = self.breaker
+        if breaker is not None and not breaker.allow_request():
+            retry_in = breaker.retry_in()
+            raise CircuitOpenError('Circuit breaker open: not sending {0} {1} (next probe in {2:.0f}s)'
+                                   .format(method, url, retry_in), retry_in)
+        try:
+            with self.profiling('network'):
+                if self.throttle is None:
+                    response = super(SessionStore, self).request(method, url, *args, **kwargs)
+                else:
+                    with self.throttle.limit(request_class):
+                        response = super(SessionStore, self).request(method, url, *args, **kwargs)
+        except (ConnectionError, Timeout):
+            if breaker is not None:
+                breaker.record_failure()
+            raise
+        except Exception:
+            # Not an endpoint failure (e.g. an invalid request): not counted
+            if breaker is not None:
+                breaker.cancel()
+            raise
+        if breaker is not None:
+            breaker.record(breaker.is_failure(response))
+        return response
 
     def request(self, *args, **kwargs):
+        if not (self.instrumentation.enabled or self.tracer.enabled):
+            return self._request_with_login(*args, **kwargs)
+
+        method, url = args[0], args[1]
+        start = time.time()
+        response = None
+        error = None
+        span = self.tracer.start_span('HTTP {0}'.format(method.upper()),
+                                      {'http.method': method.upper(), 'http.url': url}, client=True)
+        try:
+            with self.tracer.activate(span):
+                if span is not None:
+                    kwargs['headers'] = self.tracer.inject(dict(kwargs.get('headers') or {}))
+                response = self._request_with_login(*args, **kwargs)
+            if span is not None:
+                span.set_attribute('http.status_code', response.status_code)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.tracer.end_span(span, error)
+            if self.instrumentation.enabled:
+                self._emit_request_event(method, url, response, error, time.time() - start)
+
+    def _request_with_login(self, *args, **kwargs):
+        raw_size = None
+        if self.compress_requests:
+            raw_size = compress_request_body(kwargs, self.compress_min_size)
+
         response = self._request(*args, **kwargs)
+        self.transfer_stats.record_request(response.request, raw_size)
 
         if not self.verify and response.cookies:
             self._unsecure_cookie(args[1], response)
@@ -229,11 +650,17 @@ class SessionStore(requests.Session):
 
         url = args[1]
         if self.need_to_login(url, response.status_code):
-            login_response = self.cimi_login(self.login_params)
-            if login_response is not None and login_response.status_code == 201:
-                # retry the call after reauthentication
-                response = self._request(*args, **kwargs)
+            self.reauthentications += 1
+            with self.tracer.span('slipstream.reauthenticate'):
+                login_response = self.cimi_login(self.login_params)
+                if login_response is not None and login_response.status_code == 201:
+                    # retry the call after reauthentication
+                    response = self._request(*args, **kwargs)
+                    self.transfer_stats.record_request(response.request, raw_size)
+                else:
+                    self.failed_reauthentications += 1
 
+        self.transfer_stats.record_response(response)
         return response
 
     def cimi_login(self, login_params):
@@ -286,19 +713,48 @@ class Api(object):
     CIMI_PARAMETERS_NAME = ['first', 'last', 'filter', 'select', 'expand', 'orderby', 'aggregation']
 
     def __init__(self, endpoint=DEFAULT_ENDPOINT, cookie_file=None, insecure=False, reauthenticate=False,
-                 login_creds=None):
+                 login_creds=None, retry=None, throttle=None, breaker=None, timeouts=None,
+                 compress_requests=False, instrumentation=None, tracer=None, cassette=None, cache=None):
         """
         :param endpoint: SlipStream endpoint (https://nuv.la).
         :param cookie_file: cookie jar file
         :param insecure: don't check server certificate.
         :param reauthenticate: reauthenticate in case of requets failures with status code 401 or 403.
         :param login_creds: {'username': '', 'password': ''} or {'key': '', 'secret': ''}
+        :param retry: RetryPolicy applied to the requests (by default only idempotent ones).
+                      None (default) to never retry.
+        :param throttle: Throttle limiting the rate and concurrency of the requests
+                         (see slipstream.api.throttle.shared_throttle to share it between instances).
+        :param breaker: CircuitBreaker failing calls immediately with CircuitOpenError while the
+                        endpoint is failing.
+        :param timeouts: Timeout per operation family ('session', 'cimi', 'user', 'module', 'deployment',
+                         'deployment_parameter', 'vms', 'deploy', 'usage') or 'default'.
+                         A value is either a number of seconds or a (connect, read) tuple.
+                         E.g. {'default': (5, 120), 'deployment_parameter': (3, 10), 'vms': (5, 600)}
+        :param compress_requests: gzip the XML and JSON request bodies (the server has to support it).
+        :param instrumentation: Instrumentation whose hooks receive an event for each call and request
+                                (see slipstream.api.instrumentation). A new one is created if not provided.
+        :param tracer: Tracer creating the OpenTelemetry spans (see slipstream.api.tracing).
+                       Default to the global tracer provider, if OpenTelemetry is installed.
+        :param cassette: Cassette recording the HTTP exchanges or replaying them instead of contacting the
+                         server (see slipstream.api.cassette).
+        :param cache: ListingCache storing the results of list_applications() and list_project_content()
+                      (see slipstream.api.cache).
         """
         self.endpoint = endpoint
-        self.session = SessionStore(endpoint, reauthenticate, cookie_file=cookie_file,
-                                    login_params=to_login_params(login_creds))
-        self.session.verify = (insecure == False)
-        self.session.headers.update({'Accept': 'application/xml'})
+        self.cookie_file = cookie_file
+        self.insecure = insecure
+        self.reauthenticate = reauthenticate
+        self.retry = retry
+        self.throttle = throttle
+        self.breaker = breaker
+        self.timeouts = dict(timeouts or {})
+        self.compress_requests = compress_requests
+        self.instrumentation = instrumentation or Instrumentation()
+        self.tracer = tracer or Tracer()
+        self.cassette = cassette
+        self.cache = cache
+        self._login_params = to_login_params(login_creds)
         if insecure:
             try:
                 requests.packages.urllib3.disable_warnings(
@@ -309,7 +765,123 @@ class Api(object):
                     urllib3.exceptions.InsecureRequestWarning)
         self._username = None
         self._cimi_cloud_entry_point = None
+        self._session = None
+        self._session_pid = None
+
+    def __getstate__(self):
+        """Only the configuration is pickled. The ``requests`` session (live
+        sockets, cookie jar) is rebuilt lazily by the receiving process."""
+        state = self.__dict__.copy()
+        state['_login_params'] = self._current_login_params()
+        state['_session'] = None
+        state['_session_pid'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def _current_login_params(self):
+        if self._session is not None:
+            return self._session.login_params
+        return self._login_params
+
+    def _create_session(self):
+        session = SessionStore(self.endpoint, self.reauthenticate, cookie_file=self.cookie_file,
+                               login_params=self._current_login_params(), retry=self.retry,
+                               throttle=self.throttle, breaker=self.breaker, timeouts=self.timeouts,
+                               compress_requests=self.compress_requests, instrumentation=self.instrumentation,
+                               tracer=self.tracer)
+        session.verify = (self.insecure == False)
+        session.headers.update({'Accept': 'application/xml'})
+        if self.cassette is not None:
+            adapter = self.cassette.adapter()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        return session
+
+    @property
+    def session(self):
+        """The ``SessionStore`` used by this instance.
 
+        It is created on first access and recreated when accessed from another
+        process (e.g. after a fork), so that connections are never shared
+        between processes.
+        """
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            if self._session is not None:
+                logger.debug("Process {0} inherited the session of process {1}. Recreating it."
+                             .format(pid, self._session_pid))
+            self._session = self._create_session()
+            self._session_pid = pid
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        """Use 'session' in the current process (None to create a new one at the next access)."""
+        self._session = session
+        self._session_pid = os.getpid() if session is not None else None
+
+    @contextmanager
+    def profile(self, report=None, functions=False):
+        """Context manager profiling the calls done inside the 'with' block (by
+        all the threads). The wall clock and CPU time of the calls are split in
+        phases: network, backoff, decode, parse, model and iteration (see
+        slipstream.api.profiling). E.g.::
+
+            with api.profile('profile.txt') as profiler:
+                list(api.list_deployments(limit=1000))
+
+        :param report: Write the report in this file at the end of the 'with' block.
+        :param functions: Also profile the functions called by the current thread with cProfile.
+        :return: The Profiler
+        """
+        profiler = Profiler(functions=functions)
+        session = self.session
+        previous = session.profiler
+        session.profiler = profiler
+        profiler.start()
+        try:
+            yield profiler
+        finally:
+            profiler.stop()
+            session.profiler = previous
+            if report is not None:
+                profiler.write(report)
+
+    def call_options(self, **options):
+        """Context manager overriding options for the calls done by the current
+        thread inside the 'with' block. E.g.::
+
+            with api.call_options(retry=RetryPolicy(max_attempts=10)):
+                api.list_virtualmachines(limit=1000)
+
+        :keyword retry: RetryPolicy to use instead of the default one (False to disable retries)
+        :keyword request_class: Request class used by the throttle ('read', 'write' or 'deploy')
+        :keyword timeout: Timeout of each request, in seconds or as a (connect, read) tuple
+        :keyword deadline: Maximum time (in seconds) for all the requests done inside the 'with' block.
+                           DeadlineExceededError is raised when it is reached.
+        """
+        return self.session.call_options(**options)
+
+    @property
+    def retry_stats(self):
+        """Retry counters as a dict (requests, retried_requests, retries, exhausted)."""
+        return self.session.retry_stats.as_dict()
+
+    @property
+    def transfer_stats(self):
+        """Bytes sent (raw and on the wire) and received (on the wire and decoded) as a dict."""
+        return self.session.transfer_stats.as_dict()
+
+    @property
+    def breaker_state(self):
+        """State and counters of the circuit breaker as a dict, or None if there is no breaker."""
+        if self.breaker is None:
+            return None
+        return self.breaker.snapshot()
+
+    @_operation('session')
     def login(self, login_params):
         """Uses given 'login_params' to log into the SlipStream server. The
         'login_params' must be a map containing an "href" element giving the id of
@@ -357,6 +929,7 @@ class Api(object):
         return self.login(to_login_params({'key': key,
                                            'secret': secret}))
 
+    @_operation('session')
     def logout(self):
         """Logs user out by deleting session.
         """
@@ -366,6 +939,7 @@ class Api(object):
         self.session.login_params = None
         self._username = None
 
+    @_operation('session')
     def current_session(self):
         """Returns current user session or None.
 
@@ -373,7 +947,7 @@ class Api(object):
         :rtype: str
         """
         resource_type = 'sessions'
-        session = self.cimi_search(resource_type)
+        session = self.cimi_search(resource_type, fields=['id'])
         if session and session.count > 0:
             return session.sessions[0].get('id')
         else:
@@ -390,13 +964,51 @@ class Api(object):
                 self._username = self.cimi_get(session_id).json.get('username')
         return self._username
 
-    def _text_get(self, url, **params):
+    def _cache_identity(self):
+        """Identify the user in the cache keys without contacting the server."""
+        if self._username:
+            return self._username
+        login_params = self._current_login_params() or {}
+        identity = login_params.get('username') or login_params.get('key')
+        if identity:
+            return identity
+        cookies = sorted('{0}={1}'.format(c.name, c.value) for c in self.session.cookies)
+        if not cookies:
+            return 'anonymous'
+        return 'cookie-' + hashlib.sha1(';'.join(cookies).encode('utf-8')).hexdigest()
+
+    def _cached_listing(self, url, parse):
+        """The result of 'parse' (a JSON serializable list) for the XML document at
+        'url', from the cache if there is one."""
+        if self.cache is None:
+            return parse(self._xml_get(url))
+
+        def refresh():
+            with self.session.call_options(operation='cache_refresh', family='module'):
+                return parse(self._xml_get(url))
+
+        key = cache_key(self.endpoint, self._cache_identity(), url)
+        return self.cache.get(key, lambda: parse(self._xml_get(url)), refresh)
+
+    def _invalidate_cache(self):
+        if self.cache is not None:
+            self.cache.invalidate(cache_key(self.endpoint, self._cache_identity(), ''))
+
+    def _text_get(self, url, as_text=False, **params):
+        """The body of the response as UTF-8 encoded bytes, or as a str (unicode) if 'as_text' is True."""
         response = self.session.get('%s%s' % (self.endpoint, url),
                                     headers={'Accept': 'text/plain'},
                                     params=params)
         response.raise_for_status()
 
-        return response.text.encode('utf-8')
+        content = response.content
+        charset = content_charset(response) or 'utf-8'
+        if not as_text and charset in ('utf-8', 'ascii'):
+            return content
+
+        with self.session.phase('decode'):
+            text = content.decode(charset, 'replace')
+            return text if as_text else text.encode('utf-8')
 
     def _xml_get(self, url, **params):
         response = self.session.get('%s%s' % (self.endpoint, url),
@@ -404,9 +1016,12 @@ class Api(object):
                                     params=params)
         response.raise_for_status()
 
-        parser = etree.XMLParser(encoding='utf-8')
-        parser.feed(response.text.encode('utf-8'))
-        return parser.close()
+        # Parse the bytes as received. The parser uses the XML declaration to find
+        # the encoding, unless the Content-Type specifies it explicitly.
+        with self.session.phase('parse', format='xml'):
+            parser = etree.XMLParser(encoding=content_charset(response))
+            parser.feed(response.content)
+            return parser.close()
 
     def _xml_put(self, url, data):
         return self.session.put('%s%s' % (self.endpoint, url),
@@ -487,6 +1102,8 @@ class Api(object):
         other_params = {}
         for key, value in params.items():
             if key in cls.CIMI_PARAMETERS_NAME:
+                if isinstance(value, Filter):
+                    value = str(value)
                 cimi_params['$' + key] = value
             else:
                 other_params[key] = value
@@ -537,7 +1154,8 @@ class Api(object):
                     message = str(e)
             raise SlipStreamError(message, response)
 
-        return response.json()
+        with self.session.phase('parse', format='json'):
+            return response.json()
 
     def _cimi_get(self, resource_id=None, resource_type=None, params=None):
         uri = self._cimi_get_uri(resource_id, resource_type)
@@ -554,6 +1172,7 @@ class Api(object):
     def _cimi_delete(self, resource_id=None):
         return self._cimi_request('DELETE', resource_id)
 
+    @_operation('cimi')
     def cimi_get(self, resource_id, **kwargs):
         """ Retreive a CIMI resource by it's resource id
 
@@ -563,13 +1182,17 @@ class Api(object):
         :keyword    select: Select attributes to return. (resourceURI always returned)
         :type       select: str or list of str
 
+        :keyword    fields: Attributes used by the caller: only them (and the id) are returned.
+        :type       fields: str or list of str
+
         :return:    A CimiResource object corresponding to the resource
         :rtype:     CimiResource
         """
-        cimi_params, query_params = self._split_cimi_params(kwargs)
+        cimi_params, query_params = self._split_cimi_params(self._project(kwargs))
         resp_json = self._cimi_get(resource_id=resource_id, params=cimi_params)
         return models.CimiResource(resp_json)
 
+    @_operation('cimi')
     def cimi_edit(self, resource_id, data, **kwargs):
         """ Edit a CIMI resource by it's resource id
 
@@ -591,6 +1214,7 @@ class Api(object):
         cimi_params, query_params = self._split_cimi_params(kwargs)
         return models.CimiResponse(self._cimi_put(resource_id=operation_href, json=data, params=cimi_params))
 
+    @_operation('cimi')
     def cimi_delete(self, resource_id):
         """ Delete a CIMI resource by it's resource id
          
@@ -605,6 +1229,7 @@ class Api(object):
         operation_href = self._cimi_find_operation_href(resource, 'delete')
         return models.CimiResponse(self._cimi_delete(resource_id=operation_href))
 
+    @_operation('cimi')
     def cimi_add(self, resource_type, data):
         """ Add a CIMI resource to the specified resource_type (Collection)
 
@@ -621,7 +1246,8 @@ class Api(object):
         operation_href = self._cimi_find_operation_href(collection, 'add')
         return models.CimiResponse(self._cimi_post(resource_id=operation_href, json=data))
 
-    def cimi_search(self, resource_type, **kwargs):
+    @_operation('cimi')
+    def cimi_search(self, resource_type, stream=False, retain=False, **kwargs):
         """ Search for CIMI resources of the given type (Collection).
 
         :param      resource_type: Type of the resource (Collection name)
@@ -634,7 +1260,7 @@ class Api(object):
         :type       last: int
 
         :keyword    filter: CIMI filter
-        :type       filter: str
+        :type       filter: str or Filter
 
         :keyword    select: Select attributes to return. (resourceURI always returned)
         :type       select: str or list of str
@@ -648,14 +1274,100 @@ class Api(object):
         :keyword    aggregation: CIMI aggregation
         :type       aggregation: str (operator:field)
 
+        :keyword    fields: Attributes used by the caller: only them (and the id) are returned.
+        :type       fields: str or list of str
+
+        :param      stream: Return a StreamingCimiCollection, which builds each resource when it is
+                            iterated and does not keep it (for very large collections).
+        :type       stream: bool
+
+        :param      retain: [stream] Keep the resources iterated (available with 'resources_list').
+        :type       retain: bool
+
         :return:    A CimiCollection object with the list of found resources available
                     as a generator with the method 'resources()' or with the attribute 'resources_list'
         :rtype:     CimiCollection
         """
-        cimi_params, query_params = self._split_cimi_params(kwargs)
-        resp_json = self._cimi_put(resource_type=resource_type, data=cimi_params, params=query_params)
+        cimi_params, query_params = self._split_cimi_params(self._project(kwargs))
+        with self.session.call_options(request_class=READ):
+            resp_json = self._cimi_put(resource_type=resource_type, data=cimi_params, params=query_params)
+        if stream:
+            return models.StreamingCimiCollection(resp_json, resource_type, retain)
         return models.CimiCollection(resp_json, resource_type)
 
+    @staticmethod
+    def _project(kwargs):
+        fields = kwargs.pop('fields', None)
+        if fields is not None:
+            kwargs['select'] = cimi_select(fields)
+        return kwargs
+
+    def _cimi_summary(self, resource_type, cimi_filter=None, **kwargs):
+        """Search without returning any resource (only the count and the aggregations)."""
+        if cimi_filter:
+            kwargs['filter'] = cimi_filter
+        return self.cimi_search(resource_type, last=0, **kwargs)
+
+    @_operation('cimi')
+    def cimi_aggregate(self, resource_type, aggregations, filter=None):
+        """ Compute aggregations of the CIMI resources of the given type on the server
+
+        :param      resource_type: Type of the resource (Collection name)
+        :type       resource_type: str
+
+        :param      aggregations: CIMI aggregation(s) (operator:field, e.g. 'terms:state' or 'sum:size')
+        :type       aggregations: str or list of str
+
+        :param      filter: CIMI filter selecting the resources
+        :type       filter: str
+
+        :return:    The value of each aggregation (see models.parse_aggregation)
+        :rtype:     dict
+        """
+        if isinstance(aggregations, six.string_types):
+            aggregations = [aggregations]
+        collection = self._cimi_summary(resource_type, filter, aggregation=list(aggregations))
+        return dict((name, collection.aggregation(name)) for name in aggregations)
+
+    @_operation('cimi')
+    def cimi_count(self, resource_type, filter=None):
+        """ Number of CIMI resources of the given type (matching the filter)
+
+        :rtype:     int
+        """
+        return int(self._cimi_summary(resource_type, filter).json.get('count', 0))
+
+    @_operation('cimi')
+    def cimi_exists(self, resource_type, filter=None, field=None):
+        """ True if there is a CIMI resource of the given type matching the filter
+        (and having the attribute 'field' if specified)
+
+        :rtype:     bool
+        """
+        if field is not None:
+            filter = Filter.of(filter) & Field(field).not_null() if filter else Field(field).not_null()
+        return self.cimi_count(resource_type, filter) > 0
+
+    @_operation('cimi')
+    def cimi_terms(self, resource_type, field, filter=None):
+        """ Number of CIMI resources of the given type per value of 'field'
+
+        :return:    The values and their number of resources, by decreasing number
+        :rtype:     list of TermsBucket
+        """
+        name = 'terms:' + field
+        return self.cimi_aggregate(resource_type, name, filter)[name] or []
+
+    @_operation('cimi')
+    def cimi_sum(self, resource_type, field, filter=None):
+        """ Sum of the attribute 'field' of the CIMI resources of the given type
+
+        :rtype:     float
+        """
+        name = 'sum:' + field
+        return self.cimi_aggregate(resource_type, name, filter)[name] or 0
+
+    @_operation('cimi')
     def cimi_operation(self, resource_id, operation, data=None):
         """ Execute an operation on a CIMI resource
 
@@ -676,6 +1388,7 @@ class Api(object):
         resp_json = self._cimi_post(operation_href, json=data)
         return models.CimiResource(resp_json)
 
+    @_operation('user')
     def create_user(self, username, password, email, first_name, last_name,
                     organization=None, roles=None, privileged=False,
                     default_cloud=None, default_keep_running='never',
@@ -754,6 +1467,7 @@ class Api(object):
 
         return True
 
+    @_operation('user')
     def update_user(self, username=None,
                     password=None, email=None, first_name=None, last_name=None,
                     organization=None, roles=None, privileged=None,
@@ -821,6 +1535,7 @@ class Api(object):
 
         return True
 
+    @_operation('user')
     def get_user(self, username=None):
         """
         Get informations for a given user, if permitted
@@ -869,6 +1584,7 @@ class Api(object):
 
         return user
 
+    @_operation('user')
     def list_users(self):
         """
         List users (requires privileged access)
@@ -886,18 +1602,23 @@ class Api(object):
                                   last_online=elem.get('lastOnline'),
                                   online=elem.get('online'))
 
+    @_operation('module')
     def list_applications(self):
         """
         List apps in the appstore
         """
-        root = self._xml_get('/appstore')
-        for elem in element_tree__iter(root)('item'):
-            yield models.App(name=elem.get('name'),
-                             type=get_module_type(elem.get('category')),
-                             version=int(elem.get('version')),
-                             path=_mod(elem.get('resourceUri'),
-                                       with_version=False))
+        for name, module_type, version, path in self._cached_listing('/appstore', self._parse_appstore):
+            yield models.App(name=name, type=module_type, version=version, path=path)
 
+    @staticmethod
+    def _parse_appstore(root):
+        return [(elem.get('name'),
+                 get_module_type(elem.get('category')),
+                 int(elem.get('version')),
+                 _mod(elem.get('resourceUri'), with_version=False))
+                for elem in element_tree__iter(root)('item')]
+
+    @_operation('module')
     def get_element(self, path):
         """
         Get details about a project, a component or an application
@@ -906,24 +1627,97 @@ class Api(object):
         :type path: str
 
         """
+        return self._parse_module(self._get_module_xml(path))
+
+    @_operation('module')
+    def get_module_details(self, path):
+        """
+        Get a project, a component or an application with its nodes, parameters
+        and cloud image identifiers, from a single request
+
+        :param path: The path of an element (project/component/application)
+        :type path: str
+        :rtype: ModuleDetails
+
+        """
+        root = self._get_module_xml(path)
+        module_reference = root.get('moduleReferenceUri')
+        return models.ModuleDetails(module=self._parse_module(root),
+                                    module_reference=_mod(module_reference) if module_reference else None,
+                                    nodes=list(self._parse_nodes(root)),
+                                    parameters=list(self._parse_parameters(root)),
+                                    cloud_image_identifiers=list(self._parse_cloud_image_identifiers(root)))
+
+    def _get_module_xml(self, path):
         url = _mod_url(path)
         try:
-            root = self._xml_get(url)
+            return self._xml_get(url)
         except requests.HTTPError as e:
             if e.response.status_code == 403:
                 logger.debug("Access denied for path: {0}. Skipping.".format(path))
             raise
 
-        ss_module = models.Module(name=root.get('shortName'),
-                                  type=get_module_type(root.get('category')),
-                                  created=root.get('creation'),
-                                  modified=root.get('lastModified'),
-                                  description=root.get('description'),
-                                  version=int(root.get('version')),
-                                  path=_mod('%s/%s' % (root.get('parentUri').strip('/'),
-                                                       root.get('shortName'))))
-        return ss_module
+    @staticmethod
+    def _parse_module(root):
+        return models.Module(name=root.get('shortName'),
+                             type=get_module_type(root.get('category')),
+                             created=root.get('creation'),
+                             modified=root.get('lastModified'),
+                             description=root.get('description'),
+                             version=int(root.get('version')),
+                             path=_mod('%s/%s' % (root.get('parentUri').strip('/'),
+                                                  root.get('shortName'))))
+
+    @staticmethod
+    def _parse_cloud_image_identifiers(root):
+        for node in root.findall("cloudImageIdentifiers/cloudImageIdentifier"):
+            yield models.CloudImageIdentifier(
+                cloud=node.get("cloudServiceName"),
+                identifier=node.get("cloudImageIdentifier"),
+            )
+
+    @staticmethod
+    def _parse_nodes(root):
+        for node in root.findall("nodes/entry/node"):
+            yield models.Node(path=_mod(node.get("imageUri")),
+                              name=node.get('name'),
+                              cloud=node.get('cloudService'),
+                              multiplicity=node.get('multiplicity'),
+                              max_provisioning_failures=node.get('maxProvisioningFailures'),
+                              network=node.get('network'),
+                              cpu=node.get('cpu'),
+                              ram=node.get('ram'),
+                              disk=node.get('disk'),
+                              extra_disk_volatile=node.get('extraDiskVolatile'),
+                              )
 
+    @staticmethod
+    def _parse_parameters(root, parameter_name=None, parameter_names=None):
+        if parameter_name is not None:
+            query = 'parameters/entry/parameter[@name="' + parameter_name + '"]'
+        else:
+            query = 'parameters/entry/parameter'
+
+        for node in root.findall(query):
+            value = node.findtext('value', '')
+            defaultValue = node.findtext('defaultValue', '')
+            instructions = node.findtext('instructions', '')
+            name = node.get("name")
+            if parameter_names is None or name in parameter_names:
+                yield models.ModuleParameter(
+                    name=name,
+                    value=value,
+                    defaultValue=defaultValue,
+                    category=node.get("category"),
+                    description=node.get("description"),
+                    isSet=node.get("isSet"),
+                    mandatory=node.get("mandatory"),
+                    readonly=node.get("readonly"),
+                    type=node.get("type"),
+                    instructions=instructions,
+                )
+
+    @_operation('module')
     def update_component(self, path, description=None, module_reference_uri=None, cloud_identifiers=None,
                          keep_ref_uri_and_cloud_ids=False, logo_link=None):
         """
@@ -988,7 +1782,10 @@ class Api(object):
             if e.response.status_code == 403:
                 logger.debug("Access denied for path: {0}. Skipping.".format(path))
             raise
+        finally:
+            self._invalidate_cache()
 
+    @_operation('module')
     def get_cloud_image_identifiers(self, path):
         """
         Get all image identifiers associated to a native component
@@ -997,46 +1794,22 @@ class Api(object):
         :type path: str
 
         """
-        url = _mod_url(path)
-        try:
-            root = self._xml_get(url)
-        except requests.HTTPError as e:
-            if e.response.status_code == 403:
-                logger.debug("Access denied for path: {0}. Skipping.".format(path))
-            raise
-
-        for node in root.findall("cloudImageIdentifiers/cloudImageIdentifier"):
-            yield models.CloudImageIdentifier(
-                cloud=node.get("cloudServiceName"),
-                identifier=node.get("cloudImageIdentifier"),
-            )
+        root = self._get_module_xml(path)
+        for identifier in self._parse_cloud_image_identifiers(root):
+            yield identifier
 
+    @_operation('module')
     def get_application_nodes(self, path):
         """
         Get nodes of an application
         :param path: The path of an application
         :type path: str
         """
-        url = _mod_url(path)
-        try:
-            root = self._xml_get(url)
-        except requests.HTTPError as e:
-            if e.response.status_code == 403:
-                logger.debug("Access denied for path: {0}. Skipping.".format(path))
-            raise
-        for node in root.findall("nodes/entry/node"):
-            yield models.Node(path=_mod(node.get("imageUri")),
-                              name=node.get('name'),
-                              cloud=node.get('cloudService'),
-                              multiplicity=node.get('multiplicity'),
-                              max_provisioning_failures=node.get('maxProvisioningFailures'),
-                              network=node.get('network'),
-                              cpu=node.get('cpu'),
-                              ram=node.get('ram'),
-                              disk=node.get('disk'),
-                              extra_disk_volatile=node.get('extraDiskVolatile'),
-                              )
+        root = self._get_module_xml(path)
+        for node in self._parse_nodes(root):
+            yield node
 
+    @_operation('module')
     def get_parameters(self, path, parameter_name=None, parameter_names=None):
         """
         Get all or a subset of the parameters associated to a project, a component or an application
@@ -1054,39 +1827,12 @@ class Api(object):
         :rtype: list
 
         """
-        url = _mod_url(path)
-        try:
-            root = self._xml_get(url)
-        except requests.HTTPError as e:
-            if e.response.status_code == 403:
-                logger.debug("Access denied for path: {0}. Skipping.".format(path))
-            raise
-
-        if parameter_name is not None:
-            query = 'parameters/entry/parameter[@name="' + parameter_name + '"]'
-        else:
-            query = 'parameters/entry/parameter'
-
-        for node in root.findall(query):
-            value = node.findtext('value', '')
-            defaultValue = node.findtext('defaultValue', '')
-            instructions = node.findtext('instructions', '')
-            name = node.get("name")
-            if parameter_names is None or name in parameter_names:
-                yield models.ModuleParameter(
-                    name=name,
-                    value=value,
-                    defaultValue=defaultValue,
-                    category=node.get("category"),
-                    description=node.get("description"),
-                    isSet=node.get("isSet"),
-                    mandatory=node.get("mandatory"),
-                    readonly=node.get("readonly"),
-                    type=node.get("type"),
-                    instructions=instructions,
-                )
+        root = self._get_module_xml(path)
+        for parameter in self._parse_parameters(root, parameter_name, parameter_names):
+            yield parameter
 
-    def list_project_content(self, path=None, recurse=False):
+    @_operation('module')
+    def list_project_content(self, path=None, recurse=False, deadline=None):
         """
         List the content of a project
 
@@ -1094,8 +1840,16 @@ class Api(object):
         :type path: str
         :param recurse: Get project content recursively
         :type recurse: bool
+        :param deadline: Maximum time (in seconds) to list the whole content (including recursion).
+                         DeadlineExceededError is raised when it is reached.
+        :type deadline: float
 
         """
+        deadline_at = time.time() + deadline if deadline is not None else None
+        for app in self._list_project_content(path, recurse, deadline_at):
+            yield app
+
+    def _list_project_content(self, path, recurse, deadline_at):
         logger.debug("Starting with path: {0}".format(path))
         # Path normalization
         if not path:
@@ -1105,13 +1859,28 @@ class Api(object):
         logger.debug("Using normalized URL: {0}".format(url))
 
         try:
-            root = self._xml_get(url)
+            with self.session.call_options(deadline_at=deadline_at):
+                items = self._cached_listing(url, self._parse_project_content)
         except requests.HTTPError as e:
             if e.response.status_code == 403:
                 logger.debug("Access denied for path: {0}. Skipping.".format(path))
                 return
             raise
 
+        for name, module_type, version, app_path in items:
+            app = models.App(name=name,
+                             type=module_type,
+                             version=version,
+                             path=_mod(app_path, with_version=False))
+            yield app
+            if app.type == 'project' and recurse:
+                logger.debug("Recursing into path: {0}".format(app_path))
+                for app in self._list_project_content(app_path, recurse, deadline_at):
+                    yield app
+
+    @staticmethod
+    def _parse_project_content(root):
+        items = []
         for elem in element_tree__iter(root)('item'):
             # Compute module path
             if elem.get('resourceUri'):
@@ -1124,16 +1893,10 @@ class Api(object):
 
             module_type = get_module_type(elem.get('category'))
             logger.debug("Found '{0}' with path: {1}".format(module_type, app_path))
-            app = models.App(name=elem.get('name'),
-                             type=module_type,
-                             version=int(elem.get('version')),
-                             path=_mod(app_path, with_version=False))
-            yield app
-            if app.type == 'project' and recurse:
-                logger.debug("Recursing into path: {0}".format(app_path))
-                for app in self.list_project_content(app_path, recurse):
-                    yield app
+            items.append((elem.get('name'), module_type, int(elem.get('version')), app_path))
+        return items
 
+    @_operation('deployment')
     def list_deployments(self, inactive=False, cloud=None, offset=0, limit=20):
         """
         List deployments
@@ -1157,18 +1920,59 @@ class Api(object):
 
         root = self._xml_get('/run', activeOnly=(not inactive), offset=offset, limit=limit, cloud=_cloud)
         for elem in element_tree__iter(root)('item'):
-            yield models.Deployment(id=uuid.UUID(elem.get('uuid')),
-                                    module=_mod(elem.get('moduleResourceUri')),
-                                    status=elem.get('status').lower(),
-                                    started_at=elem.get('startTime'),
-                                    last_state_change=elem.get('lastStateChangeTime'),
-                                    clouds=elem.get('cloudServiceNames', '').split(','),
-                                    username=elem.get('username'),
-                                    abort=elem.get('abort'),
-                                    service_url=elem.get('serviceUrl'),
-                                    scalable=elem.get('mutable'),
-                                    )
+            yield self._parse_deployment_item(elem)
+
+    @_operation('deployment')
+    def list_deployment_changes(self, known, inactive=False, cloud=None, offset=0, limit=20):
+        """
+        List deployments, only building the Deployment of the new ones and of
+        the ones whose state changed (see slipstream.api.deployments)
+
+        :param known: The last state change time of the known deployments, by id (str)
+        :type known: dict
+
+        :param inactive: Include inactive deployments. Default to False
+        :type inactive: bool
+
+        :param cloud: Retrieve only deployments for the specified Cloud
+        :type cloud: str
+
+        :param offset: Retrieve deployments starting by the offset<exp>th</exp> one. Default to 0
+        :type offset: int
+
+        :param limit: Retrieve at most 'limit' deployments. Default to 20
+        :type limit: int
+
+        :return: A (id, last_state_change, Deployment or None if unchanged) tuple per deployment
+        :rtype: list
+        """
+        root = self._xml_get('/run', activeOnly=(not inactive), offset=offset, limit=limit,
+                             cloud=cloud if cloud is not None else '')
+        items = []
+        for elem in element_tree__iter(root)('item'):
+            deployment_id = elem.get('uuid')
+            last_state_change = elem.get('lastStateChangeTime')
+            if deployment_id in known and known[deployment_id] == last_state_change:
+                items.append((deployment_id, last_state_change, None))
+            else:
+                items.append((deployment_id, last_state_change, self._parse_deployment_item(elem)))
+        return items
+
+    @staticmethod
+    def _parse_deployment_item(elem):
+        return models.Deployment(id=uuid.UUID(elem.get('uuid')),
+                                 module=_mod(elem.get('moduleResourceUri')),
+                                 status=elem.get('status').lower(),
+                                 started_at=elem.get('startTime'),
+                                 last_state_change=elem.get('lastStateChangeTime'),
+                                 clouds=elem.get('cloudServiceNames', '').split(','),
+                                 username=elem.get('username'),
+                                 abort=elem.get('abort'),
+                                 service_url=elem.get('serviceUrl'),
+                                 scalable=elem.get('mutable'),
+                                 )
 
+    @_operation('deployment')
     def get_deployment(self, deployment_id):
         """
         Get a deployment
@@ -1194,6 +1998,7 @@ class Api(object):
                                  scalable=root.get('mutable'),
                                  )
 
+    @_operation('deployment_parameter')
     def get_deployment_parameter(self, deployment_id, parameter_name, ignore_abort=False):
         """
         Get a parameter of a deployment
@@ -1211,14 +2016,25 @@ class Api(object):
         return self._text_get('/run/{0}/{1}'.format(str(deployment_id), parameter_name),
                               ignoreabort=ignoreabort)
 
+    @_operation('deployment')
+    def get_node_instances(self, deployment_id):
+        """
+        Get the instances of the nodes of a deployment (from its run document)
+
+        :param deployment_id: The deployment UUID of the deployment
+        :type deployment_id: str or UUID
+
+        :return: The sorted list of instance ids of each node
+        :rtype: dict
+
+        """
+        return _parse_node_instances(self._xml_get('/run/' + str(deployment_id)))
+
+    @_operation('deployment')
     def get_deployment_events(self, deployment_id, types=None):
-        if types is None:
-            types = []
-        filter = "content/resource/href='run/%s'" % deployment_id
-        if types:
-            filter += " and (%s)" % ' or '.join(map(lambda x: "type='%s'" % x, types))
-        return self.cimi_search(resource_type='events', filter=filter)
+        return self.cimi_search(resource_type='events', filter=deployment_events_filter(deployment_id, types))
 
+    @_operation('vms')
     def list_virtualmachines(self, deployment_id=None, cloud=None, offset=0, limit=20):
         """
         List virtual machines
@@ -1261,6 +2077,7 @@ class Api(object):
                                         instance_type=elem.get('instanceType'),
                                         is_usable=elem.get('isUsable'))
 
+    @_operation('deploy')
     def build_component(self, path, cloud=None):
         """
 
@@ -1270,15 +2087,17 @@ class Api(object):
         :type cloud: str
 
         """
-        response = self.session.post(self.endpoint + '/run', data={
-            'type': 'Machine',
-            'refqname': path,
-            'parameter--cloudservice': cloud or 'default',
-        })
+        with self.session.call_options(request_class=DEPLOY):
+            response = self.session.post(self.endpoint + '/run', data={
+                'type': 'Machine',
+                'refqname': path,
+                'parameter--cloudservice': cloud or 'default',
+            })
         response.raise_for_status()
         run_id = response.headers['location'].split('/')[-1]
         return uuid.UUID(run_id)
 
+    @_operation('deploy')
     def deploy(self, path, cloud=None, parameters=None, tags=None, keep_running=None, scalable=False, multiplicity=None,
                tolerate_failures=None, check_ssh_key=False, raw_params=None):
         """
@@ -1343,16 +2162,18 @@ class Api(object):
         if not check_ssh_key:
             _raw_params['bypass-ssh-check'] = 'true'
 
-        response = self.session.post(self.endpoint + '/run', data=_raw_params)
+        with self.session.call_options(request_class=DEPLOY):
+            response = self.session.post(self.endpoint + '/run', data=_raw_params)
 
         if response.status_code == 409:
             reason = etree.fromstring(response.text).get('detail')
-            raise SlipStreamError(reason)
+            raise SlipStreamError(reason, response)
 
         response.raise_for_status()
         deployment_id = response.headers['location'].split('/')[-1]
         return uuid.UUID(deployment_id)
 
+    @_operation('deploy')
     def terminate(self, deployment_id):
         """
         Terminate a deployment
@@ -1361,10 +2182,12 @@ class Api(object):
         :type deployment_id: str or uuid.UUID
 
         """
-        response = self.session.delete('%s/run/%s' % (self.endpoint, deployment_id))
+        with self.session.call_options(request_class=DEPLOY):
+            response = self.session.delete('%s/run/%s' % (self.endpoint, deployment_id))
         response.raise_for_status()
         return True
 
+    @_operation('deploy')
     def add_node_instances(self, deployment_id, node_name, quantity=None):
         """
         Add new instance(s) of a deployment's node (horizontal scale up).
@@ -1385,16 +2208,18 @@ class Api(object):
         url = '%s/run/%s/%s' % (self.endpoint, str(deployment_id), str(node_name))
         data = {"n": quantity} if quantity else None
 
-        response = self.session.post(url, data=data)
+        with self.session.call_options(request_class=DEPLOY):
+            response = self.session.post(url, data=data)
 
         if response.status_code == 409:
             reason = etree.fromstring(response.text).get('detail')
-            raise SlipStreamError(reason)
+            raise SlipStreamError(reason, response)
 
         response.raise_for_status()
 
         return response.text.split(",")
 
+    @_operation('deploy')
     def remove_node_instances(self, deployment_id, node_name, ids):
         """
         Remove a list of node instances from a deployment.
@@ -1414,16 +2239,18 @@ class Api(object):
         """
         url = '%s/run/%s/%s' % (self.endpoint, str(deployment_id), str(node_name))
 
-        response = self.session.delete(url, data={"ids": ",".join(str(id_) for id_ in ids)})
+        with self.session.call_options(request_class=DEPLOY):
+            response = self.session.delete(url, data={"ids": ",".join(str(id_) for id_ in ids)})
 
         if response.status_code == 409:
             reason = etree.fromstring(response.text).get('detail')
-            raise SlipStreamError(reason)
+            raise SlipStreamError(reason, response)
 
         response.raise_for_status()
 
         return response.status_code == 204
 
+    @_operation('usage')
     def usage(self):
         """
         Get current usage and quota by cloud service.
@@ -1439,6 +2266,7 @@ class Api(object):
                                pending_vm_usage=int(elem.get('pendingVmUsage')),
                                unknown_vm_usage=int(elem.get('unknownVmUsage')))
 
+    @_operation('module')
     def publish(self, path):
         """
         Publish a component or an application to the appstore
@@ -1449,8 +2277,10 @@ class Api(object):
         response = self.session.put('%s%s/publish' % (self.endpoint,
                                                       _mod_url(path)))
         response.raise_for_status()
+        self._invalidate_cache()
         return True
 
+    @_operation('module')
     def unpublish(self, path):
         """
         Unpublish a component or an application from the appstore
@@ -1461,8 +2291,10 @@ class Api(object):
         response = self.session.delete('%s%s/publish' % (self.endpoint,
                                                          _mod_url(path)))
         response.raise_for_status()
+        self._invalidate_cache()
         return True
 
+    @_operation('module')
     def delete_element(self, path):
         """
         Delete a project, a component or an application
@@ -1473,6 +2305,7 @@ class Api(object):
         response = self.session.delete('%s%s' % (self.endpoint, _mod_url(path)))
 
         response.raise_for_status()
+        self._invalidate_cache()
         return True
 
     @staticmethod
@@ -1536,8 +2369,7 @@ class Api(object):
 
         return raw_params
 
+    @_operation('cimi')
     def get_cloud_credentials(self, cimi_filter=''):
-        filter = "type^='cloud-cred'"
-        if cimi_filter:
-            filter += 'and %s' % cimi_filter
+        filter = Field('type').startswith('cloud-cred') & cimi_filter
         return self.cimi_search(resource_type='credentials', filter=filter)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import absolute_import
+
+import time
+
+from collections import deque
+from threading import Lock
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+FAILURE_STATUS_CODES = frozenset([500, 502, 503, 504])
+
+
+class CircuitBreaker(object):
+    """Stop sending requests to an endpoint which keeps failing.
+
+    The breaker is 'closed' while the failure rate of the requests done in the
+    last 'window' seconds stays below 'failure_rate_threshold' (evaluated once
+    at least 'minimum_calls' requests were done). It then becomes 'open': no
+    request is allowed during 'reset_timeout' seconds. After that it becomes
+    'half-open' and lets 'half_open_max_calls' probe requests through. The
+    breaker is closed again once all of them succeeded and opened again at the
+    first failure.
+
+    Connection errors, timeouts and the status codes in 'failure_status_codes'
+    are counted as failures.
+    """
+
+    def __init__(self, failure_rate_threshold=0.5, minimum_calls=10, window=60, reset_timeout=30,
+                 half_open_max_calls=1, failure_status_codes=FAILURE_STATUS_CODES):
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.failure_status_codes = frozenset(failure_status_codes)
+        self._lock = Lock()
+        self._calls = deque()
+        self._state = CLOSED
+        self._opened_at = None
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+        self.opened_count = 0
+        self.rejected_count = 0
+
+    def __reduce__(self):
+        # The lock cannot be pickled: rebuild a closed breaker with the same settings
+        return CircuitBreaker, (self.failure_rate_threshold, self.minimum_calls, self.window,
+                                self.reset_timeout, self.half_open_max_calls, self.failure_status_codes)
+
+    def _update_state(self, now):
+        if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+            self._half_open_successes = 0
+
+    def _open(self, now):
+        self._state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+        self.opened_count += 1
+
+    @property
+    def state(self):
+        with self._lock:
+            self._update_state(time.time())
+            return self._state
+
+    def retry_in(self):
+        """Time (in seconds) before the breaker lets a probe request through (0 if not open)."""
+        with self._lock:
+            if self._state != OPEN:
+                return 0
+            return max(0, self._opened_at + self.reset_timeout - time.time())
+
+    def allow_request(self):
+        with self._lock:
+            self._update_state(time.time())
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            self.rejected_count += 1
+            return False
+
+    def cancel(self):
+        """A request allowed by allow_request() was not sent (nor failed): free its probe slot."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def is_failure(self, response):
+        return response.status_code in self.failure_status_codes
+
+    def record(self, failed):
+        now = time.time()
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if failed:
+                    self._open(now)
+                    return
+                self._half_open_successes += 1
+                if self._half_open_successes >= self.half_open_max_calls:
+                    self._state = CLOSED
+                    self._calls.clear()
+                return
+            if self._state == OPEN:
+                return
+
+            self._calls.append((now, failed))
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._calls.popleft()
+            if len(self._calls) >= self.minimum_calls:
+                failures = sum(1 for _, f in self._calls if f)
+                if float(failures) / len(self._calls) >= self.failure_rate_threshold:
+                    self._open(now)
+
+    def record_success(self):
+        self.record(False)
+
+    def record_failure(self):
+        self.record(True)
+
+    def snapshot(self):
+        """State and counters of the breaker as a dict (e.g. for dashboards)."""
+        with self._lock:
+            self._update_state(time.time())
+            failures = sum(1 for _, f in self._calls if f)
+            return dict(state=self._state,
+                        calls_in_window=len(self._calls),
+                        failures_in_window=failures,
+                        opened_count=self.opened_count,
+                        rejected_count=self.rejected_count,
+                        opened_at=self._opened_at if self._state != CLOSED else None)
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Persistent cache of the module listings (``list_applications()`` and
+ ``list_project_content()``), stored in SQLite and shared by the processes
+ using the same file::
+
+    from slipstream.api import Api
+    from slipstream.api.cache import ListingCache
+
+    api = Api(cache=ListingCache(ttl=300))
+
+    # Served from the cache when the listing is less than 5 minutes old.
+    # An older listing is still served (up to 'max_stale' seconds) while it is
+    # refreshed in the background.
+    apps = list(api.list_applications())
+
+ The entries are keyed by endpoint, user and URL. The least recently used
+ ones are evicted when the cache exceeds 'max_entries' or 'max_size' bytes.
+ Publishing, unpublishing, updating or deleting a module through the Api
+ invalidates the entries of the endpoint and user.
+"""
+
+from __future__ import absolute_import
+
+import os
+import json
+import stat
+import time
+import logging
+import sqlite3
+import threading
+import collections
+
+from .instrumentation import Metric
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_FILE = os.path.expanduser('~/.slipstream/cache.sqlite')
+
+HIT = 'hit'
+STALE = 'stale'
+MISS = 'miss'
+
+# The cache is an optimization: failing to use it is logged, never raised
+_ERRORS = (sqlite3.Error, OSError)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS listings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored REAL NOT NULL,
+    accessed REAL NOT NULL
+)'''
+
+
+def cache_key(endpoint, identity, url):
+    return '{0}|{1}|{2}'.format(endpoint, identity, url)
+
+
+class ListingCache(object):
+    """SQLite cache of JSON serializable listings.
+
+    :param path: Path of the SQLite database.
+    :param ttl: Age (in seconds) below which an entry is served without contacting the server.
+    :param max_stale: Additional age (in seconds) during which an expired entry is still served while it
+                      is refreshed in the background. Default to 'ttl'. 0 to always refresh synchronously.
+                      The refresh runs in a daemon thread: a short lived process (e.g. a CLI command)
+                      usually exits before it completes, so only use a long 'max_stale' in long lived
+                      processes.
+    :param max_entries: Maximum number of entries.
+    :param max_size: Maximum total size of the entries (in bytes).
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, ttl=300, max_stale=None, max_entries=10000,
+                 max_size=32 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_stale = ttl if max_stale is None else max_stale
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._refreshing = {}
+        self._stats = collections.Counter()
+        self._initialized = False
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_refreshing'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if not self._initialized:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            if not os.path.isdir(directory):
+                os.makedirs(directory, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
+        connection = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            with connection:
+                connection.execute(_SCHEMA)
+            self._initialized = True
+        return connection
+
+    def _load(self, key):
+        connection = self._connect()
+        try:
+            with connection:
+                row = connection.execute('SELECT value, stored FROM listings WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    connection.execute('UPDATE listings SET accessed = ? WHERE key = ?', (time.time(), key))
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _store(self, key, value):
+        data = json.dumps(value, separators=(',', ':'))
+        now = time.time()
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute('INSERT OR REPLACE INTO listings (key, value, size, stored, accessed) '
+                                   'VALUES (?, ?, ?, ?, ?)', (key, data, len(data), now, now))
+                evicted = self._evict(connection)
+        finally:
+            connection.close()
+        if evicted:
+            self._count('evictions', evicted)
+
+    def _evict(self, connection):
+        count, size = connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM listings').fetchone()
+        if count <= self.max_entries and size <= self.max_size:
+            return 0
+        evicted = 0
+        for key, entry_size in connection.execute('SELECT key, size FROM listings ORDER BY accessed').fetchall():
+            if count <= self.max_entries and size <= self.max_size:
+                break
+            connection.execute('DELETE FROM listings WHERE key = ?', (key,))
+            count -= 1
+            size -= entry_size
+            evicted += 1
+        return evicted
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._stats[name] += value
+
+    def get(self, key, fetch, refresh=None):
+        """The value cached for 'key', or the result of 'fetch()' (stored in the cache).
+
+        An entry older than 'ttl' but within 'max_stale' is returned and
+        refreshed with 'refresh()' (default to 'fetch') in a background thread.
+        """
+        try:
+            entry = self._load(key)
+        except _ERRORS as e:
+            logger.warning('Cannot read the cache {0}: {1}'.format(self.path, e))
+            entry = None
+
+        if entry is not None:
+            value, stored = entry
+            age = time.time() - stored
+            if age < self.ttl:
+                self._count(HIT)
+                return value
+            if age < self.ttl + self.max_stale:
+                self._count(STALE)
+                self._refresh_in_background(key, refresh or fetch)
+                return value
+
+        self._count(MISS)
+        value = fetch()
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        try:
+            self._store(key, value)
+        except _ERRORS as e:
+            logger.warning('Cannot write the cache {0}: {1}'.format(self.path, e))
+
+    def _refresh_in_background(self, key, fetch):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            thread = threading.Thread(target=self._refresh, args=(key, fetch), name='slipstream-cache-refresh')
+            thread.daemon = True
+            self._refreshing[key] = thread
+        thread.start()
+
+    def _refresh(self, key, fetch):
+        try:
+            self.put(key, fetch())
+            self._count('refreshes')
+        except Exception as e:
+            self._count('refresh_errors')
+            logger.debug('Background refresh of {0} failed: {1}'.format(key, e))
+        finally:
+            with self._lock:
+                self._refreshing.pop(key, None)
+
+    def wait(self, timeout=None):
+        """Wait for the background refreshes in progress (e.g. before exiting)."""
+        with self._lock:
+            threads = list(self._refreshing.values())
+        deadline = time.time() + timeout if timeout is not None else None
+        for thread in threads:
+            thread.join(None if deadline is None else max(0, deadline - time.time()))
+
+    def invalidate(self, prefix=''):
+        """Remove the entries whose key starts with 'prefix' (all by default)."""
+        pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        try:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute("DELETE FROM listings WHERE key LIKE ? ESCAPE '\\'", (pattern,))
+            finally:
+                connection.close()
+        except _ERRORS as e:
+            logger.warning('Cannot invalidate the cache {0}: {1}'.format(self.path, e))
+
+    def clear(self):
+        self.invalidate()
+
+    def stats(self):
+        """Counters (hit, stale, miss, refreshes, refresh_errors, evictions) and hit ratio as a dict."""
+        with self._lock:
+            stats = dict((name, self._stats.get(name, 0))
+                         for name in (HIT, STALE, MISS, 'refreshes', 'refresh_errors', 'evictions'))
+        lookups = stats[HIT] + stats[STALE] + stats[MISS]
+        stats['hit_ratio'] = float(stats[HIT] + stats[STALE]) / lookups if lookups else None
+        return stats
+
+    def metrics(self):
+        """The statistics of the cache as a list of Metric, to be registered with
+        OpenMetricsExporter.add_source()."""
+        stats = self.stats()
+        metrics = [
+            Metric('cache_lookups', 'counter', 'Lookups in the listing cache by result.',
+                   [('_total', dict(result=result), stats[result]) for result in (HIT, STALE, MISS)]),
+            Metric('cache_hit_ratio', 'gauge', 'Ratio of the lookups served from the listing cache.',
+                   [('', {}, stats['hit_ratio'])]),
+            Metric('cache_refreshes', 'counter', 'Background refreshes of the listing cache.',
+                   [('_total', dict(result='success'), stats['refreshes']),
+                    ('_total', dict(result='failure'), stats['refresh_errors'])]),
+            Metric('cache_evictions', 'counter', 'Entries evicted from the listing cache.',
+                   [('_total', {}, stats['evictions'])]),
+        ]
+        try:
+            connection = self._connect()
+            try:
+                count, size = connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM listings').fetchone()
+            finally:
+                connection.close()
+        except _ERRORS:
+            return metrics
+        metrics.append(Metric('cache_entries', 'gauge', 'Entries in the listing cache.', [('', {}, count)]))
+        metrics.append(Metric('cache_size_bytes', 'gauge', 'Size of the entries in the listing cache.',
+                              [('', {}, size)]))
+        return metrics
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Record the HTTP exchanges of an ``Api`` in an archive and replay them
+ later without any network access (e.g. to profile the parsing of large
+ documents deterministically).::
+
+    from slipstream.api import Api
+    from slipstream.api.cassette import Cassette
+
+    # Record
+    with Cassette('vms.cassette', mode='record') as cassette:
+        api = Api(cassette=cassette)
+        api.login_internal('username', 'password')
+        vms = list(api.list_virtualmachines(limit=50000))
+
+    # Replay (with 50ms of simulated latency per request)
+    api = Api(cassette=Cassette('vms.cassette', mode='replay', latency=0.05))
+    vms = list(api.list_virtualmachines(limit=50000))
+
+ The archive is a zip file containing the list of the exchanges
+ (``interactions.json``) and the bodies of the responses. The ``Set-Cookie``
+ headers are not recorded: the session token of the login stays off disk.
+"""
+
+from __future__ import absolute_import
+
+import io
+import json
+import time
+import hashlib
+import zipfile
+import threading
+import collections
+
+from requests import Response
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from six.moves.urllib.parse import urlsplit, parse_qsl, urlencode
+
+from .api import SlipStreamError
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+# The recorded bodies are already decoded. The session cookies are never written
+# to the archive (cassettes are shared as test fixtures)
+_IGNORED_HEADERS = frozenset(['content-encoding', 'content-length', 'transfer-encoding', 'connection',
+                              'set-cookie'])
+
+
+class CassetteMissError(SlipStreamError):
+    """Raised in replay mode when no recorded exchange matches a request."""
+    pass
+
+
+def _request_key(request, match_body):
+    parts = urlsplit(request.url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    key = '{0} {1}?{2}'.format(request.method.upper(), parts.path, query)
+    if match_body and request.body:
+        body = request.body if isinstance(request.body, bytes) else request.body.encode('utf-8')
+        key += ' ' + hashlib.sha1(body).hexdigest()
+    return key
+
+
+class Cassette(object):
+    """Archive of HTTP exchanges.
+
+    :param path: Path of the archive.
+    :param mode: 'record' to capture the exchanges (saved by save() or when
+                 leaving the 'with' block) or 'replay' to serve them back
+                 from memory.
+    :param latency: [replay] Simulated latency: a number of seconds per
+                    request, 'recorded' to wait as long as the recorded
+                    request took, or None for no latency.
+    :param match_body: Include the request body in the key used to match
+                       the requests.
+    """
+
+    def __init__(self, path, mode=REPLAY, latency=None, match_body=True):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError('"mode" should be "{0}" or "{1}", not "{2}"'.format(RECORD, REPLAY, mode))
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.match_body = match_body
+        self._lock = threading.Lock()
+        self._interactions = []
+        self._index = collections.defaultdict(list)
+        self._positions = collections.Counter()
+        if mode == REPLAY:
+            self.load()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        if self.mode == RECORD:
+            self.save()
+
+    def __len__(self):
+        return len(self._interactions)
+
+    def adapter(self, transport=None):
+        """The transport adapter to mount on a session ('transport' is the
+        adapter used to really send the requests when recording)."""
+        if self.mode == RECORD:
+            return RecordingAdapter(self, transport)
+        return ReplayAdapter(self)
+
+    def add(self, request, response, body, elapsed):
+        interaction = dict(key=_request_key(request, self.match_body),
+                           method=request.method,
+                           url=request.url,
+                           status=response.status_code,
+                           reason=response.reason,
+                           headers=[(k, v) for k, v in response.headers.items()
+                                    if k.lower() not in _IGNORED_HEADERS],
+                           elapsed=elapsed)
+        with self._lock:
+            self._interactions.append((interaction, body))
+
+    def save(self, path=None):
+        path = path or self.path
+        with self._lock:
+            interactions = list(self._interactions)
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            metadata = []
+            for i, (interaction, body) in enumerate(interactions):
+                name = 'bodies/{0}'.format(i)
+                archive.writestr(name, body)
+                metadata.append(dict(interaction, body=name))
+            archive.writestr('interactions.json', json.dumps(metadata))
+
+    def load(self, path=None):
+        path = path or self.path
+        with zipfile.ZipFile(path, 'r') as archive:
+            metadata = json.loads(archive.read('interactions.json').decode('utf-8'))
+            interactions = [(m, archive.read(m['body'])) for m in metadata]
+        with self._lock:
+            self._interactions = interactions
+            self._index.clear()
+            self._positions.clear()
+            for interaction, body in interactions:
+                self._index[interaction['key']].append((interaction, body))
+
+    def find(self, request):
+        """The recorded (interaction, body) matching 'request'. When a request
+        was recorded several times the recorded responses are served in order,
+        the last one being repeated."""
+        key = _request_key(request, self.match_body)
+        with self._lock:
+            candidates = self._index.get(key)
+            if not candidates:
+                raise CassetteMissError('No recorded response for {0} {1}'.format(request.method, request.url))
+            position = self._positions[key]
+            self._positions[key] = position + 1
+            return candidates[min(position, len(candidates) - 1)]
+
+
+class RecordingAdapter(BaseAdapter):
+    """Send the requests with a real adapter and record the exchanges in a Cassette."""
+
+    def __init__(self, cassette, transport=None):
+        super(RecordingAdapter, self).__init__()
+        self.cassette = cassette
+        self.transport = transport or HTTPAdapter()
+
+    def send(self, request, **kwargs):
+        start = time.time()
+        response = self.transport.send(request, **kwargs)
+        if not kwargs.get('stream'):
+            body = response.content
+            self.cassette.add(request, response, body, time.time() - start)
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """Answer the requests with the responses recorded in a Cassette."""
+
+    def __init__(self, cassette):
+        super(ReplayAdapter, self).__init__()
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        interaction, body = self.cassette.find(request)
+
+        latency = self.cassette.latency
+        if latency == 'recorded':
+            latency = interaction.get('elapsed')
+        if latency:
+            time.sleep(latency)
+
+        response = Response()
+        response.status_code = interaction['status']
+        response.reason = interaction.get('reason')
+        response.headers = CaseInsensitiveDict(interaction['headers'])
+        response.headers['Content-Length'] = str(len(body))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(body)
+        response._content = body
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import absolute_import
+
+import io
+import six
+import gzip
+import json
+import logging
+
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+ACCEPT_ENCODING = 'gzip, deflate'
+SUPPORTED_ENCODINGS = frozenset(['gzip', 'x-gzip', 'deflate', 'identity'])
+DEFAULT_MIN_SIZE = 1024
+
+
+def gzip_compress(data, compresslevel=6):
+    buf = io.BytesIO()
+    # No timestamp in the header: the same data always gives the same bytes
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=compresslevel, mtime=0) as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+def compress_request_body(kwargs, min_size=DEFAULT_MIN_SIZE, compresslevel=6):
+    """Gzip in place the body ('data' or 'json') of the keyword arguments of a
+    ``requests.Session.request`` call if it is at least 'min_size' bytes long.
+
+    :return: The size of the uncompressed body if it has been compressed, otherwise None
+    """
+    data = kwargs.get('data')
+    json_body = kwargs.get('json')
+    headers = dict(kwargs.get('headers') or {})
+    if data is None and json_body is not None:
+        data = json.dumps(json_body).encode('utf-8')
+        headers.setdefault('Content-Type', 'application/json')
+    if isinstance(data, six.text_type):
+        data = data.encode('utf-8')
+    if not isinstance(data, six.binary_type) or len(data) < min_size:
+        return None
+    kwargs['data'] = gzip_compress(data, compresslevel)
+    kwargs['json'] = None
+    headers['Content-Encoding'] = 'gzip'
+    kwargs['headers'] = headers
+    return len(data)
+
+
+def body_size(request):
+    body = getattr(request, 'body', None)
+    if isinstance(body, (six.binary_type, six.text_type)):
+        return len(body)
+    return 0
+
+
+def wire_size(response):
+    """Number of bytes of the body of 'response' as received on the wire
+    (i.e. before decompression)."""
+    tell = getattr(response.raw, 'tell', None)
+    if tell is not None:
+        try:
+            size = tell()
+            if size:
+                return size
+        except Exception:
+            pass
+    try:
+        return int(response.headers.get('Content-Length'))
+    except (TypeError, ValueError):
+        return len(response.content)
+
+
+class TransferStats(object):
+    """Thread-safe counters of the bytes sent and received by a session."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.requests = 0
+        self.sent_raw = 0
+        self.sent_wire = 0
+        self.compressed_requests = 0
+        self.responses = 0
+        self.received_wire = 0
+        self.received_decoded = 0
+        self.compressed_responses = 0
+        self.unsupported_encodings = 0
+
+    def record_request(self, request, raw_size=None):
+        """Count the size of the body of the (prepared) 'request'. 'raw_size'
+        is the size of the body before compression if it has been compressed."""
+        wire = body_size(request)
+        with self._lock:
+            self.requests += 1
+            self.sent_wire += wire
+            self.sent_raw += raw_size if raw_size is not None else wire
+            if raw_size is not None:
+                self.compressed_requests += 1
+
+    def record_response(self, response):
+        """Count the size of 'response' and check that its content encoding is
+        one which was negotiated (otherwise the body cannot be decoded)."""
+        encoding = response.headers.get('Content-Encoding', 'identity').strip().lower()
+        supported = encoding in SUPPORTED_ENCODINGS
+        if not supported:
+            logger.warning('Unsupported Content-Encoding "{0}" for {1}: body left undecoded.'
+                           .format(encoding, response.url))
+        decoded = len(response.content or b'')
+        wire = wire_size(response)
+        with self._lock:
+            self.responses += 1
+            self.received_decoded += decoded
+            self.received_wire += wire
+            if encoding != 'identity' and supported:
+                self.compressed_responses += 1
+            if not supported:
+                self.unsupported_encodings += 1
+
+    def as_dict(self):
+        with self._lock:
+            return dict(requests=self.requests,
+                        sent_raw=self.sent_raw,
+                        sent_wire=self.sent_wire,
+                        compressed_requests=self.compressed_requests,
+                        responses=self.responses,
+                        received_wire=self.received_wire,
+                        received_decoded=self.received_decoded,
+                        compressed_responses=self.compressed_responses,
+                        unsupported_encodings=self.unsupported_encodings)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Incremental synchronization of a local table of deployments::
+
+    from slipstream.api import Api
+    from slipstream.api.deployments import DeploymentSync
+
+    api = Api()
+    deployments = DeploymentSync(api)
+
+    for delta in deployments.follow(interval=30):
+        for deployment in delta.added + delta.changed:
+            print(deployment.id, deployment.status)
+        for deployment in delta.removed:
+            print(deployment.id, 'gone')
+
+ Only the deployments which are new or whose last state change time moved
+ since the previous sync are parsed into ``Deployment`` objects. By default
+ each sync still lists all the deployments (every page is requested): the
+ number of requests only drops with 'ordered_by_state_change', for servers
+ listing the deployments by last state change.
+"""
+
+from __future__ import absolute_import
+
+import time
+import logging
+import threading
+import collections
+
+logger = logging.getLogger(__name__)
+
+DeploymentDelta = collections.namedtuple('DeploymentDelta', ['added', 'changed', 'removed'])
+
+
+class DeploymentSync(object):
+    """Local table of the deployments, updated by sync().
+
+    By default every sync is a full listing: all the pages of deployments are
+    requested and only the parsing of the unchanged ones is saved. The cost
+    of a sync is proportional to the number of changes only with
+    'ordered_by_state_change', which the client cannot request and has to be
+    enabled for the servers known to use this order.
+
+    :param api: The Api used to list the deployments.
+    :param inactive: Include inactive deployments.
+    :param cloud: Only the deployments of this cloud.
+    :param page_size: Number of deployments listed per request.
+    :param ordered_by_state_change: The server lists the deployments by
+        descending last state change time. The listing then stops at the
+        first page ending with an unchanged deployment, and removed
+        deployments are only detected by the full syncs.
+    :param full_sync_every: [ordered_by_state_change] Do a full listing every
+        'full_sync_every' syncs.
+    :param removal_confirmations: Number of consecutive full listings a
+        deployment has to be missing from to be removed (use 2 to tolerate
+        the deployments shifting between pages during a listing).
+    """
+
+    def __init__(self, api, inactive=False, cloud=None, page_size=500, ordered_by_state_change=False,
+                 full_sync_every=10, removal_confirmations=1):
+        self.api = api
+        self.inactive = inactive
+        self.cloud = cloud
+        self.page_size = page_size
+        self.ordered_by_state_change = ordered_by_state_change
+        self.full_sync_every = full_sync_every
+        self.removal_confirmations = removal_confirmations
+        self.syncs = 0
+        self.last_sync = None
+        self._deployments = {}
+        self._missing = collections.Counter()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._deployments)
+
+    def __iter__(self):
+        return iter(self.deployments)
+
+    def __contains__(self, deployment_id):
+        return str(deployment_id) in self._deployments
+
+    @property
+    def deployments(self):
+        """The deployments of the local table (as a list)."""
+        with self._lock:
+            return list(self._deployments.values())
+
+    def get(self, deployment_id, default=None):
+        return self._deployments.get(str(deployment_id), default)
+
+    def sync(self):
+        """Update the local table.
+
+        :return: The deployments added, changed and removed since the previous sync
+        :rtype: DeploymentDelta
+        """
+        start = time.time()
+        full = not self.ordered_by_state_change or self.syncs % self.full_sync_every == 0
+        with self._lock:
+            known = dict((k, d.last_state_change) for k, d in self._deployments.items())
+
+        seen = set()
+        updates = []
+        pages = 0
+        offset = 0
+        while True:
+            items = self.api.list_deployment_changes(known, inactive=self.inactive, cloud=self.cloud,
+                                                     offset=offset, limit=self.page_size)
+            pages += 1
+            for deployment_id, _, deployment in items:
+                seen.add(deployment_id)
+                if deployment is not None:
+                    updates.append((deployment_id, deployment))
+            # A server ignoring 'limit' returns everything at once
+            if len(items) != self.page_size:
+                break
+            if not full and items[-1][2] is None:
+                break
+            offset += self.page_size
+
+        added = []
+        changed = []
+        removed = []
+        with self._lock:
+            for deployment_id, deployment in updates:
+                if deployment_id in self._deployments:
+                    changed.append(deployment)
+                else:
+                    added.append(deployment)
+                self._deployments[deployment_id] = deployment
+            if full:
+                for deployment_id in list(self._deployments):
+                    if deployment_id in seen:
+                        self._missing.pop(deployment_id, None)
+                        continue
+                    self._missing[deployment_id] += 1
+                    if self._missing[deployment_id] >= self.removal_confirmations:
+                        del self._missing[deployment_id]
+                        removed.append(self._deployments.pop(deployment_id))
+            self.syncs += 1
+            self.last_sync = time.time()
+
+        logger.debug("Synchronized deployments in {0:.2f}s ({1} pages, {2}): {3} added, {4} changed, {5} removed"
+                     .format(time.time() - start, pages, 'full' if full else 'incremental', len(added),
+                             len(changed), len(removed)))
+        return DeploymentDelta(added, changed, removed)
+
+    def follow(self, interval=30, include_empty=False):
+        """Generator calling sync() every 'interval' seconds and yielding the
+        deltas (only the non empty ones, unless 'include_empty' is True)."""
+        while True:
+            start = time.time()
+            delta = self.sync()
+            if include_empty or delta.added or delta.changed or delta.removed:
+                yield delta
+            time.sleep(max(0, interval - (time.time() - start)))
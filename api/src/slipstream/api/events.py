@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Follow the CIMI events as they are created::
+
+    from slipstream.api import Api
+    from slipstream.api.events import EventFeed
+
+    api = Api()
+
+    # All the new events
+    for event in EventFeed(api):
+        print(event.timestamp, event.type, event.content)
+
+    # The events of a deployment, from the beginning, with asyncio
+    feed = EventFeed.for_deployment(api, deployment_id, types=['state'], start=EventFeed.BEGINNING)
+    async for event in feed:
+        print(event.content['state'])
+
+ The feed keeps a cursor (the timestamp of the last event and the ids of
+ the events seen with that timestamp) and only asks the server for the
+ events at or after it, ordered by timestamp and id, skipping the ones
+ already seen. A burst of events is paged through before waiting for the
+ next poll. The poll interval grows
+ while there is no new event and after errors, up to 'max_interval'.
+"""
+
+from __future__ import absolute_import
+
+import logging
+import threading
+
+from collections import deque
+
+from requests import RequestException
+
+from .api import SlipStreamError, deployment_events_filter
+from .query import Field, Query
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_TYPE = 'events'
+ORDER_BY = ('timestamp:asc', 'id:asc')
+
+
+class EventFeed(object):
+    """Iterator (and asyncio asynchronous iterator) over the new events.
+
+    :param api: The Api used to search the events.
+    :param filter: CIMI filter selecting the events to follow.
+    :param start: EventFeed.NOW (default) to only get the events created from now on,
+                  EventFeed.BEGINNING to get all the events, or a timestamp.
+    :param follow: Wait for new events once the existing ones have been returned.
+                   If False the iteration stops when there is no new event.
+    :param page_size: Maximum number of events per request.
+    :param interval: Time (in seconds) between two polls while events are found.
+    :param max_interval: Maximum time between two polls.
+    :param backoff: Factor applied to the poll interval after a poll without new events or failing.
+    :param max_errors: Number of consecutive failed polls after which the error is raised
+                       (None to never give up).
+    """
+
+    NOW = 'now'
+    BEGINNING = 'beginning'
+
+    def __init__(self, api, filter=None, start=NOW, follow=True, page_size=100, interval=2, max_interval=60,
+                 backoff=2, max_errors=None):
+        self.api = api
+        self.filter = filter
+        self.follow = follow
+        self.page_size = page_size
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_errors = max_errors
+        self.timestamp = None
+        self.seen_ids = set()
+        self.errors = 0
+        self.delay = interval
+        self._buffer = deque()
+        self._started = start != self.NOW
+        self._stopped = threading.Event()
+        # Built once: each poll only adds the cursor and the paging
+        query = Query(RESOURCE_TYPE, filter)
+        self._query = query.order_by(*ORDER_BY)
+        self._latest = query.order_by('timestamp:desc', 'id:desc').select('timestamp')
+        self._ids = query.select('id')
+        if start not in (self.NOW, self.BEGINNING):
+            self.timestamp = start
+
+    @classmethod
+    def for_deployment(cls, api, deployment_id, types=None, **kwargs):
+        """EventFeed of the events of a deployment (of the given types)."""
+        return cls(api, filter=deployment_events_filter(deployment_id, types), **kwargs)
+
+    @property
+    def cursor(self):
+        """(timestamp, ids of the events seen with this timestamp) of the last event returned."""
+        return self.timestamp, frozenset(self.seen_ids)
+
+    def stop(self):
+        """Stop the iteration (after the event being processed)."""
+        self._stopped.set()
+
+    def _start(self):
+        """Move the cursor to the last existing event."""
+        latest = self._latest.search(self.api, first=1, last=1).resources_list
+        if latest:
+            self.timestamp = latest[0].timestamp
+            at_cursor = self._ids.search(self.api, where=Field('timestamp') == self.timestamp)
+            self.seen_ids = set(e.id for e in at_cursor.resources_list)
+        self._started = True
+
+    def poll(self):
+        """Get the events after the cursor (paging through all of them) and move the cursor.
+
+        :return: The new events, in the order of their timestamps
+        :rtype: list of CimiResource
+        """
+        if not self._started:
+            self._start()
+            return []
+
+        events = []
+        # No offset from the seen events: one created late with the timestamp of the
+        # cursor may sort before them. Page from the cursor and skip the seen ids.
+        cursor = Field('timestamp') >= self.timestamp if self.timestamp is not None else None
+        seen = set(self.seen_ids)
+        # The cursor only moves once all the pages were read: if a search fails,
+        # the next poll gets the events of this one again
+        timestamp = self.timestamp
+        seen_ids = set(self.seen_ids)
+        first = 1
+        while True:
+            page = self._query.search(self.api, first, first + self.page_size - 1, cursor).resources_list
+            for event in page:
+                if event.id in seen:
+                    continue
+                seen.add(event.id)
+                events.append(event)
+                if timestamp is None or event.timestamp > timestamp:
+                    timestamp = event.timestamp
+                    seen_ids = set()
+                if event.timestamp == timestamp:
+                    seen_ids.add(event.id)
+            # Also stops if the server ignores the paging and returns everything at once
+            if len(page) != self.page_size:
+                self.timestamp = timestamp
+                self.seen_ids = seen_ids
+                return events
+            first += self.page_size
+
+    def _poll(self):
+        """poll(), handling the errors. Compute the delay before the next one."""
+        try:
+            events = self.poll()
+        except (SlipStreamError, RequestException) as e:
+            self.errors += 1
+            if self.max_errors is not None and self.errors >= self.max_errors:
+                raise
+            self.delay = min(self.max_interval, self.delay * self.backoff)
+            logger.warning('Polling the events failed ({0}). Retrying in {1:.1f}s.'.format(e, self.delay))
+            return None
+        self.errors = 0
+        if events:
+            self.delay = self.interval
+        else:
+            self.delay = min(self.max_interval, self.delay * self.backoff)
+        return events
+
+    def _done(self, events):
+        return self._stopped.is_set() or (events is not None and not events and not self.follow)
+
+    def __iter__(self):
+        while not self._stopped.is_set():
+            events = self._poll()
+            for event in events or ():
+                yield event
+                if self._stopped.is_set():
+                    return
+            if self._done(events):
+                return
+            self._stopped.wait(self.delay)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        """Future resolved with the next event. The polls are run in the default
+        executor of the event loop and the waits are scheduled on the loop."""
+        import asyncio
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._async_step(loop, future)
+        return future
+
+    def _async_step(self, loop, future):
+        if future.cancelled():
+            return
+        if self._buffer:
+            future.set_result(self._buffer.popleft())
+        elif self._stopped.is_set():
+            future.set_exception(StopAsyncIteration())
+        else:
+            polled = loop.run_in_executor(None, self._poll)
+            polled.add_done_callback(lambda f: self._async_polled(loop, future, f))
+
+    def _async_polled(self, loop, future, polled):
+        if future.cancelled():
+            return
+        if polled.exception() is not None:
+            future.set_exception(polled.exception())
+            return
+        events = polled.result()
+        if events:
+            self._buffer.extend(events)
+            future.set_result(self._buffer.popleft())
+        elif self._done(events):
+            future.set_exception(StopAsyncIteration())
+        else:
+            loop.call_later(self.delay, self._async_step, loop, future)
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Export the client side metrics of an ``Api`` instance in the OpenMetrics
+ text format, to be scraped by Prometheus.::
+
+    from slipstream.api import Api
+    from slipstream.api.exporter import OpenMetricsExporter
+
+    api = Api()
+    exporter = OpenMetricsExporter(api)
+
+    # Serve the metrics on http://localhost:9464/metrics
+    exporter.serve(9464)
+
+    # Or write them periodically in a file (e.g. for the node_exporter textfile collector)
+    exporter.write('/var/lib/node_exporter/slipstream.prom')
+
+"""
+
+from __future__ import absolute_import
+
+import os
+import logging
+import tempfile
+import threading
+import collections
+
+from six.moves import BaseHTTPServer, socketserver
+
+from .instrumentation import CallEvent, Metric, RequestEvent
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(k, _escape(v)) for k, v in sorted(labels.items())) + '}'
+
+
+def _format_value(value):
+    if value is None:
+        return 'NaN'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        return repr(value) if value == value else 'NaN'
+    return str(value)
+
+
+class _Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def samples(self, labels):
+        samples = []
+        for bound, count in zip(self.buckets, self.counts):
+            samples.append(('_bucket', dict(labels, le=_format_value(float(bound))), count))
+        samples.append(('_bucket', dict(labels, le='+Inf'), self.count))
+        samples.append(('_count', labels, self.count))
+        samples.append(('_sum', labels, self.sum))
+        return samples
+
+
+class OpenMetricsExporter(object):
+    """Collect the instrumentation events of an Api and render them, with the
+    statistics of its session (retries, transfers, connection pools,
+    reauthentications, circuit breaker, throttle), in the OpenMetrics format.
+
+    Additional sources of metrics can be registered with add_source(): a
+    callable returning a list of Metric.
+    """
+
+    def __init__(self, api, prefix='slipstream_api', buckets=DEFAULT_BUCKETS):
+        self.api = api
+        self.prefix = prefix
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._requests = collections.Counter()
+        self._request_errors = collections.Counter()
+        self._calls = collections.Counter()
+        self._call_errors = collections.Counter()
+        self._request_latency = {}
+        self._call_latency = {}
+        self._sources = []
+        self._server = None
+        api.instrumentation.add_hook(self)
+
+    def add_source(self, source):
+        self._sources.append(source)
+
+    def __call__(self, event):
+        with self._lock:
+            if isinstance(event, RequestEvent):
+                key = (event.method, event.url_template)
+                status = str(event.status) if event.status is not None else 'none'
+                self._requests[key + (status,)] += 1
+                if event.error is not None:
+                    self._request_errors[key + (type(event.error).__name__,)] += 1
+                self._observe(self._request_latency, key, event.network_time)
+            elif isinstance(event, CallEvent):
+                key = (event.operation,)
+                self._calls[key] += 1
+                if event.error is not None:
+                    self._call_errors[key + (type(event.error).__name__,)] += 1
+                self._observe(self._call_latency, key, event.duration)
+
+    def _observe(self, histograms, key, value):
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = _Histogram(self.buckets)
+        histogram.observe(value)
+
+    def _event_metrics(self):
+        request_labels = ('method', 'url', 'status')
+        with self._lock:
+            metrics = [
+                Metric('requests', 'counter', 'HTTP requests by method, URL template and status.',
+                       [('_total', dict(zip(request_labels, k)), v) for k, v in self._requests.items()]),
+                Metric('request_errors', 'counter', 'HTTP requests which raised an exception.',
+                       [('_total', dict(zip(('method', 'url', 'error'), k)), v)
+                        for k, v in self._request_errors.items()]),
+                Metric('request_duration_seconds', 'histogram', 'Duration of the HTTP requests.',
+                       [s for k, h in self._request_latency.items()
+                        for s in h.samples(dict(zip(('method', 'url'), k)))]),
+                Metric('calls', 'counter', 'Api method calls.',
+                       [('_total', dict(operation=k[0]), v) for k, v in self._calls.items()]),
+                Metric('call_errors', 'counter', 'Api method calls which raised an exception.',
+                       [('_total', dict(zip(('operation', 'error'), k)), v) for k, v in self._call_errors.items()]),
+                Metric('call_duration_seconds', 'histogram', 'Duration of the Api method calls.',
+                       [s for k, h in self._call_latency.items() for s in h.samples(dict(operation=k[0]))]),
+            ]
+        return metrics
+
+    def _session_metrics(self):
+        session = self.api.session
+        retry_stats = session.retry_stats.as_dict()
+        transfer_stats = session.transfer_stats.as_dict()
+        metrics = [
+            Metric('retries', 'counter', 'Retries of HTTP requests.',
+                   [('_total', {}, retry_stats['retries'])]),
+            Metric('retries_exhausted', 'counter', 'HTTP requests which failed after all the retries.',
+                   [('_total', {}, retry_stats['exhausted'])]),
+            Metric('sent_bytes', 'counter', 'Bytes of request bodies.',
+                   [('_total', dict(stage='raw'), transfer_stats['sent_raw']),
+                    ('_total', dict(stage='wire'), transfer_stats['sent_wire'])]),
+            Metric('received_bytes', 'counter', 'Bytes of response bodies.',
+                   [('_total', dict(stage='wire'), transfer_stats['received_wire']),
+                    ('_total', dict(stage='decoded'), transfer_stats['received_decoded'])]),
+            Metric('reauthentications', 'counter', 'Reauthentications after a 401 or 403 response.',
+                   [('_total', dict(result='success'), session.reauthentications - session.failed_reauthentications),
+                    ('_total', dict(result='failure'), session.failed_reauthentications)]),
+        ] + self._pool_metrics(session)
+        if session.breaker is not None:
+            snapshot = session.breaker.snapshot()
+            # The label of a stateset is named after its metric family
+            state_label = '{0}_circuit_breaker_state'.format(self.prefix)
+            metrics.append(Metric('circuit_breaker_state', 'stateset', 'State of the circuit breaker.',
+                                  [('', {state_label: state}, snapshot['state'] == state)
+                                   for state in ('closed', 'open', 'half-open')]))
+            metrics.append(Metric('circuit_breaker_rejected', 'counter', 'Requests rejected by the circuit breaker.',
+                                  [('_total', {}, snapshot['rejected_count'])]))
+        if session.throttle is not None:
+            stats = session.throttle.stats()
+            metrics.append(Metric('throttle_in_flight', 'gauge', 'Requests in flight per request class.',
+                                  [('', dict(request_class=k), v['in_flight']) for k, v in stats.items()]))
+            metrics.append(Metric('throttle_wait_seconds', 'counter', 'Time spent waiting for the throttle.',
+                                  [('_total', dict(request_class=k), v['wait_time']) for k, v in stats.items()]))
+        return metrics
+
+    @staticmethod
+    def _pool_metrics(session):
+        idle = []
+        opened = []
+        requests = []
+        for prefix, adapter in session.adapters.items():
+            pools = getattr(getattr(adapter, 'poolmanager', None), 'pools', None)
+            if pools is None:
+                continue
+            for key in list(pools.keys()):
+                try:
+                    pool = pools[key]
+                except KeyError:
+                    continue
+                labels = dict(host='{0}://{1}:{2}'.format(pool.scheme, pool.host, pool.port))
+                # The queue of the pool is filled with None placeholders
+                idle.append(('', labels, sum(1 for c in list(pool.pool.queue) if c is not None) if pool.pool else 0))
+                # Cumulative since the pool was created
+                opened.append(('_total', labels, pool.num_connections))
+                requests.append(('_total', labels, pool.num_requests))
+        return [Metric('connection_pool_idle', 'gauge', 'Idle connections of the HTTP connection pools.', idle),
+                Metric('connection_pool_opened', 'counter', 'Connections opened by the HTTP connection pools.',
+                       opened),
+                Metric('connection_pool_requests', 'counter', 'Requests sent by the HTTP connection pools.',
+                       requests)]
+
+    def collect(self):
+        """All the metrics as a list of Metric."""
+        metrics = self._event_metrics() + self._session_metrics()
+        for source in self._sources:
+            try:
+                metrics.extend(source())
+            except Exception:
+                logger.exception('Metrics source {0!r} failed.'.format(source))
+        return metrics
+
+    def render(self):
+        """The metrics in the OpenMetrics text format."""
+        lines = []
+        for metric in self.collect():
+            name = '{0}_{1}'.format(self.prefix, metric.name)
+            lines.append('# TYPE {0} {1}'.format(name, metric.type))
+            lines.append('# HELP {0} {1}'.format(name, metric.help))
+            for suffix, labels, value in metric.samples:
+                lines.append('{0}{1}{2} {3}'.format(name, suffix, _format_labels(labels), _format_value(value)))
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Atomically write the metrics in the file 'path'."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.slipstream-metrics-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.render().encode('utf-8'))
+            os.rename(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def serve(self, port, address='127.0.0.1', path='/metrics'):
+        """Serve the metrics over HTTP on 'address':'port' from a daemon thread.
+
+        Only on the loopback interface by default: pass address='' (all the
+        interfaces) or the address of an interface to expose them to the network.
+
+        :return: The HTTP server (call shutdown() on it to stop it)
+        """
+        exporter = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != path:
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+
+        self._server = Server((address, port), Handler)
+        thread = threading.Thread(target=self._server.serve_forever, name='slipstream-metrics')
+        thread.daemon = True
+        thread.start()
+        return self._server
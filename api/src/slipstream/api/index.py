@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Local SQLite index of the modules (projects, components and applications)
+ with their nodes, parameters and cloud image identifiers::
+
+    from slipstream.api import Api
+    from slipstream.api.index import ModuleIndex
+
+    api = Api()
+    index = ModuleIndex(api)
+
+    # Only the modules whose version changed since the last sync are downloaded
+    index.sync('examples')
+
+    index.find_by_image_identifier('ami-0f1a2b3c')
+    index.applications_using('examples/images/ubuntu-16.04')
+    index.find_by_parameter('cpu.nb', value='4')
+
+"""
+
+from __future__ import absolute_import
+
+import os
+import stat
+import time
+import logging
+import sqlite3
+import threading
+
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_FILE = os.path.expanduser('~/.slipstream/modules.sqlite')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS modules (
+    endpoint TEXT NOT NULL,
+    path TEXT NOT NULL,
+    name TEXT,
+    type TEXT,
+    version INTEGER,
+    created TEXT,
+    modified TEXT,
+    description TEXT,
+    module_reference TEXT,
+    synced REAL,
+    PRIMARY KEY (endpoint, path)
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    endpoint TEXT NOT NULL,
+    module TEXT NOT NULL,
+    name TEXT,
+    component TEXT,
+    cloud TEXT,
+    multiplicity TEXT,
+    max_provisioning_failures TEXT,
+    network TEXT,
+    cpu TEXT,
+    ram TEXT,
+    disk TEXT,
+    extra_disk_volatile TEXT
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    endpoint TEXT NOT NULL,
+    module TEXT NOT NULL,
+    name TEXT,
+    value TEXT,
+    default_value TEXT,
+    category TEXT,
+    description TEXT,
+    is_set TEXT,
+    mandatory TEXT,
+    readonly TEXT,
+    type TEXT,
+    instructions TEXT
+);
+CREATE TABLE IF NOT EXISTS cloud_image_identifiers (
+    endpoint TEXT NOT NULL,
+    module TEXT NOT NULL,
+    cloud TEXT,
+    identifier TEXT
+);
+CREATE INDEX IF NOT EXISTS modules_reference ON modules (endpoint, module_reference);
+CREATE INDEX IF NOT EXISTS nodes_module ON nodes (endpoint, module);
+CREATE INDEX IF NOT EXISTS nodes_component ON nodes (endpoint, component);
+CREATE INDEX IF NOT EXISTS nodes_cloud ON nodes (endpoint, cloud);
+CREATE INDEX IF NOT EXISTS parameters_module ON parameters (endpoint, module);
+CREATE INDEX IF NOT EXISTS parameters_name ON parameters (endpoint, name);
+CREATE INDEX IF NOT EXISTS cloud_image_identifiers_module ON cloud_image_identifiers (endpoint, module);
+CREATE INDEX IF NOT EXISTS cloud_image_identifiers_identifier ON cloud_image_identifiers (endpoint, identifier);
+CREATE INDEX IF NOT EXISTS cloud_image_identifiers_cloud ON cloud_image_identifiers (endpoint, cloud);
+'''
+
+_MODULE_COLUMNS = ', '.join('m.' + c for c in models.Module._fields)
+_CHILD_TABLES = ('nodes', 'parameters', 'cloud_image_identifiers')
+
+
+def unversioned(path):
+    """'path' without its trailing version number (e.g. 'examples/images/ubuntu/1234')."""
+    if path is None:
+        return None
+    head, _, tail = path.rstrip('/').rpartition('/')
+    return head if head and tail.isdigit() else path
+
+
+class ModuleIndex(object):
+    """SQLite index of the modules of the endpoint of 'api'.
+
+    :param api: The Api used to synchronize the index.
+    :param path: Path of the SQLite database (it can hold the modules of several endpoints).
+    :param workers: Number of modules downloaded concurrently by sync().
+    """
+
+    def __init__(self, api, path=DEFAULT_INDEX_FILE, workers=4):
+        self.api = api
+        self.path = path
+        self.workers = workers
+        self.endpoint = api.endpoint
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_connection'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            if not os.path.isdir(directory):
+                os.makedirs(directory, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _query(self, sql, *params):
+        with self._lock:
+            return self.connection.execute(sql, (self.endpoint,) + params).fetchall()
+
+    def sync(self, path=None):
+        """Synchronize the modules under 'path' (all if None) with the server.
+
+        The module tree is listed recursively and only the modules which are
+        new or whose version changed are downloaded. The modules which are
+        not listed anymore are removed.
+
+        :param path: The path of a project
+        :return: The number of modules 'added', 'updated', 'removed', 'unchanged' and 'failed' as a dict
+        """
+        start = time.time()
+        prefix = (path or '').strip('/')
+        listed = dict((app.path, app.version) for app in self.api.list_project_content(prefix or None, recurse=True))
+        if prefix:
+            try:
+                root = self.api.get_element(prefix)
+                listed[root.path] = root.version
+            except requests.HTTPError as e:
+                logger.debug("Cannot index {0}: {1}".format(prefix, e))
+
+        indexed = dict(self._indexed_versions(prefix))
+        changed = [p for p, version in listed.items() if indexed.get(p) != version]
+        removed = [p for p in indexed if p not in listed]
+
+        stats = dict(added=0, updated=0, removed=len(removed), unchanged=len(listed) - len(changed), failed=0)
+        for module_path, details in self._fetch(changed):
+            if details is None:
+                stats['failed'] += 1
+                continue
+            self._store(module_path, details)
+            stats['updated' if module_path in indexed else 'added'] += 1
+
+        with self._lock:
+            with self.connection as connection:
+                for module_path in removed:
+                    self._delete(connection, module_path)
+
+        logger.debug("Synchronized {0} modules under '{1}' in {2:.2f}s: {3}"
+                     .format(len(listed), prefix, time.time() - start, stats))
+        return stats
+
+    def _indexed_versions(self, prefix):
+        if not prefix:
+            return self._query('SELECT path, version FROM modules WHERE endpoint = ?')
+        pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '/%'
+        return self._query("SELECT path, version FROM modules WHERE endpoint = ? AND (path = ? OR path LIKE ? "
+                           "ESCAPE '\\')", prefix, pattern)
+
+    def _fetch_one(self, module_path):
+        try:
+            return module_path, self.api.get_module_details(module_path)
+        except requests.HTTPError as e:
+            logger.debug("Cannot index {0}: {1}".format(module_path, e))
+            return module_path, None
+
+    def _fetch(self, paths):
+        if self.workers <= 1 or len(paths) <= 1:
+            return (self._fetch_one(p) for p in paths)
+        pool = ThreadPool(min(self.workers, len(paths)))
+        try:
+            return list(pool.imap_unordered(self._fetch_one, paths))
+        finally:
+            pool.close()
+            pool.join()
+
+    def _store(self, module_path, details):
+        module = details.module
+        with self._lock:
+            with self.connection as connection:
+                self._delete(connection, module_path)
+                connection.execute('INSERT INTO modules (endpoint, path, name, type, version, created, modified, '
+                                   'description, module_reference, synced) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                   (self.endpoint, module_path, module.name, module.type, module.version,
+                                    module.created, module.modified, module.description,
+                                    unversioned(details.module_reference), time.time()))
+                connection.executemany('INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                       [(self.endpoint, module_path, n.name, unversioned(n.path), n.cloud,
+                                         n.multiplicity, n.max_provisioning_failures, n.network, n.cpu, n.ram,
+                                         n.disk, n.extra_disk_volatile) for n in details.nodes])
+                connection.executemany('INSERT INTO parameters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                       [(self.endpoint, module_path, p.name, p.value, p.defaultValue, p.category,
+                                         p.description, p.isSet, p.mandatory, p.readonly, p.type, p.instructions)
+                                        for p in details.parameters])
+                connection.executemany('INSERT INTO cloud_image_identifiers VALUES (?, ?, ?, ?)',
+                                       [(self.endpoint, module_path, c.cloud, c.identifier)
+                                        for c in details.cloud_image_identifiers])
+
+    def _delete(self, connection, module_path):
+        connection.execute('DELETE FROM modules WHERE endpoint = ? AND path = ?', (self.endpoint, module_path))
+        for table in _CHILD_TABLES:
+            connection.execute('DELETE FROM {0} WHERE endpoint = ? AND module = ?'.format(table),
+                               (self.endpoint, module_path))
+
+    def _modules(self, where='', *params):
+        rows = self._query('SELECT {0} FROM modules m WHERE m.endpoint = ? {1} ORDER BY m.path'
+                           .format(_MODULE_COLUMNS, where), *params)
+        return [models.Module(*row) for row in rows]
+
+    def get(self, path):
+        """The indexed Module at 'path', or None."""
+        modules = self._modules('AND m.path = ?', path.strip('/'))
+        return modules[0] if modules else None
+
+    def modules(self, type=None):
+        """All the indexed modules (of the given type: 'project', 'component' or 'application')."""
+        if type is None:
+            return self._modules()
+        return self._modules('AND m.type = ?', type)
+
+    def nodes(self, path):
+        """The nodes of the application at 'path'."""
+        rows = self._query('SELECT component, name, cloud, multiplicity, max_provisioning_failures, network, cpu, '
+                           'ram, disk, extra_disk_volatile FROM nodes WHERE endpoint = ? AND module = ? '
+                           'ORDER BY name', path.strip('/'))
+        return [models.Node(*row) for row in rows]
+
+    def parameters(self, path):
+        """The parameters of the module at 'path'."""
+        rows = self._query('SELECT name, value, default_value, category, description, is_set, mandatory, readonly, '
+                           'type, instructions FROM parameters WHERE endpoint = ? AND module = ? ORDER BY name',
+                           path.strip('/'))
+        return [models.ModuleParameter(*row) for row in rows]
+
+    def cloud_image_identifiers(self, path):
+        """The cloud image identifiers of the component at 'path'."""
+        rows = self._query('SELECT cloud, identifier FROM cloud_image_identifiers WHERE endpoint = ? AND module = ? '
+                           'ORDER BY cloud', path.strip('/'))
+        return [models.CloudImageIdentifier(*row) for row in rows]
+
+    def find_by_image_identifier(self, identifier, cloud=None):
+        """The components having the cloud image 'identifier' (on 'cloud')."""
+        where = 'AND m.path IN (SELECT module FROM cloud_image_identifiers WHERE endpoint = m.endpoint ' \
+                'AND identifier = ?{0})'.format(' AND cloud = ?' if cloud is not None else '')
+        params = (identifier, cloud) if cloud is not None else (identifier,)
+        return self._modules(where, *params)
+
+    def find_by_cloud(self, cloud):
+        """The components having an image on 'cloud' and the applications with a node deployed on 'cloud'."""
+        return self._modules('AND (m.path IN (SELECT module FROM cloud_image_identifiers '
+                             'WHERE endpoint = m.endpoint AND cloud = ?) '
+                             'OR m.path IN (SELECT module FROM nodes WHERE endpoint = m.endpoint AND cloud = ?))',
+                             cloud, cloud)
+
+    def find_by_parameter(self, name, value=None):
+        """The modules defining the parameter 'name' (with the given 'value')."""
+        where = 'AND m.path IN (SELECT module FROM parameters WHERE endpoint = m.endpoint AND name = ?{0})' \
+            .format(' AND value = ?' if value is not None else '')
+        params = (name, value) if value is not None else (name,)
+        return self._modules(where, *params)
+
+    def applications_using(self, component):
+        """The applications with a node running 'component' (path, with or without version)."""
+        return self._modules('AND m.path IN (SELECT module FROM nodes WHERE endpoint = m.endpoint AND component = ?)',
+                             unversioned(component.strip('/')))
+
+    def components_referencing(self, component):
+        """The components built on top of 'component' (through their module reference)."""
+        return self._modules('AND m.module_reference = ?', unversioned(component.strip('/')))
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Instrumentation of the calls done through an ``Api`` instance.
+
+ Hooks are callables registered on ``Api.instrumentation``. They receive a
+ ``RequestEvent`` for each HTTP request and a ``CallEvent`` for each public
+ ``Api`` method call::
+
+    from slipstream.api import Api
+    from slipstream.api.instrumentation import HistogramCollector
+
+    api = Api()
+    collector = HistogramCollector()
+    api.instrumentation.add_hook(collector)
+
+    list(api.list_deployments())
+    print(collector.report())
+
+"""
+
+from __future__ import absolute_import
+
+import re
+import math
+import time
+import logging
+import collections
+
+from threading import Lock
+
+from six.moves.urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+RequestEvent = collections.namedtuple('RequestEvent', [
+    'operation',
+    'method',
+    'url_template',
+    'status',
+    'bytes_sent',
+    'bytes_received',
+    'network_time',
+    'retries',
+    'error',
+])
+
+CallEvent = collections.namedtuple('CallEvent', [
+    'operation',
+    'family',
+    'status',
+    'duration',
+    'network_time',
+    'parse_time',
+    'requests',
+    'retries',
+    'bytes_received',
+    'error',
+])
+
+Metric = collections.namedtuple('Metric', ['name', 'type', 'help', 'samples'])
+"""A metric family (see slipstream.api.exporter). 'samples' is a list of (suffix, labels dict, value)."""
+
+_uuid_re = re.compile('[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+_url_templates = [
+    (re.compile(r'^/module/.+/publish$'), '/module/{path}/publish'),
+    (re.compile(r'^/module/(?!\{path\}).+$'), '/module/{path}'),
+    (re.compile(r'^/user/[^/]+$'), '/user/{username}'),
+    (re.compile(r'^/run/\{id\}/[^/]+$'), '/run/{id}/{name}'),
+    (re.compile(r'/[0-9]+(?=/|$)'), '/{n}'),
+]
+
+
+def url_template(url):
+    """Path of 'url' where the variable parts (ids, module paths, names) are
+    replaced by placeholders, to group the requests by kind."""
+    path = urlparse(url).path
+    path = _uuid_re.sub('{id}', path)
+    for regex, replacement in _url_templates:
+        path = regex.sub(replacement, path)
+    return path
+
+
+class CallRecord(object):
+    """Accumulate the measures of one public Api method call."""
+
+    __slots__ = ('operation', 'family', 'start', 'duration', 'network_time', 'phases', 'requests',
+                 'retries', 'bytes_received', 'status', 'error')
+
+    def __init__(self, operation, family):
+        self.operation = operation
+        self.family = family
+        self.start = time.time()
+        self.duration = 0.0
+        self.network_time = 0.0
+        self.phases = {}
+        self.requests = 0
+        self.retries = 0
+        self.bytes_received = 0
+        self.status = None
+        self.error = None
+
+    def add_request(self, event):
+        self.requests += 1
+        self.network_time += event.network_time
+        self.retries += event.retries
+        self.bytes_received += event.bytes_received
+        self.status = event.status
+
+    def add_phase(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def to_event(self):
+        return CallEvent(operation=self.operation,
+                         family=self.family,
+                         status=self.status,
+                         duration=self.duration,
+                         network_time=self.network_time,
+                         parse_time=self.phases.get('parse', 0.0),
+                         requests=self.requests,
+                         retries=self.retries,
+                         bytes_received=self.bytes_received,
+                         error=self.error)
+
+
+class Instrumentation(object):
+    """Registry of the hooks receiving the RequestEvent and CallEvent of an Api.
+
+    Hooks are not pickled with the Api: each process registers its own.
+    """
+
+    def __init__(self):
+        self.hooks = []
+
+    def __reduce__(self):
+        return Instrumentation, ()
+
+    @property
+    def enabled(self):
+        return bool(self.hooks)
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def start_call(self, operation, family):
+        if not self.hooks:
+            return None
+        return CallRecord(operation, family)
+
+    def emit(self, event):
+        for hook in list(self.hooks):
+            try:
+                hook(event)
+            except Exception:
+                logger.exception('Instrumentation hook {0!r} failed.'.format(hook))
+
+
+def percentile(sorted_values, p):
+    """Percentile 'p' (0-100) of an already sorted list of values (nearest rank)."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(math.ceil(p / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+class HistogramCollector(object):
+    """Hook keeping in memory the durations of the calls (per operation) and
+    of the requests (per method and URL template).
+
+    At most 'max_samples' durations are kept per key (the most recent ones).
+    """
+
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self._lock = Lock()
+        self._calls = collections.defaultdict(lambda: collections.deque(maxlen=self.max_samples))
+        self._requests = collections.defaultdict(lambda: collections.deque(maxlen=self.max_samples))
+        self.call_counts = collections.Counter()
+        self.error_counts = collections.Counter()
+        self.status_counts = collections.Counter()
+        self.retries = collections.Counter()
+
+    def __call__(self, event):
+        with self._lock:
+            if isinstance(event, CallEvent):
+                self._calls[event.operation].append(event.duration)
+                self.call_counts[event.operation] += 1
+                if event.error is not None:
+                    self.error_counts[event.operation] += 1
+            elif isinstance(event, RequestEvent):
+                key = '{0} {1}'.format(event.method, event.url_template)
+                self._requests[key].append(event.network_time)
+                self.status_counts[(key, event.status)] += 1
+                self.retries[key] += event.retries
+
+    def clear(self):
+        with self._lock:
+            self._calls.clear()
+            self._requests.clear()
+            self.call_counts.clear()
+            self.error_counts.clear()
+            self.status_counts.clear()
+            self.retries.clear()
+
+    @staticmethod
+    def _summarize(samples, percentiles):
+        values = sorted(samples)
+        summary = collections.OrderedDict()
+        summary['count'] = len(values)
+        summary['mean'] = sum(values) / len(values) if values else None
+        for p in percentiles:
+            summary['p{0}'.format(p)] = percentile(values, p)
+        summary['max'] = values[-1] if values else None
+        return summary
+
+    def call_summary(self, percentiles=(50, 95, 99)):
+        """Statistics of the durations (in seconds) of the calls per operation."""
+        with self._lock:
+            return dict((k, self._summarize(v, percentiles)) for k, v in self._calls.items())
+
+    def request_summary(self, percentiles=(50, 95, 99)):
+        """Statistics of the network times (in seconds) of the requests per method and URL template."""
+        with self._lock:
+            return dict((k, self._summarize(v, percentiles)) for k, v in self._requests.items())
+
+    def report(self, percentiles=(50, 95, 99)):
+        """Text table of the call and request statistics (times in milliseconds)."""
+        lines = []
+        columns = ['count', 'mean'] + ['p{0}'.format(p) for p in percentiles] + ['max']
+        for title, summary in (('Operation', self.call_summary(percentiles)),
+                               ('Request', self.request_summary(percentiles))):
+            if not summary:
+                continue
+            width = max(len(title), max(len(k) for k in summary))
+            lines.append(title.ljust(width) + ''.join(c.rjust(10) for c in columns))
+            for key in sorted(summary):
+                stats = summary[key]
+                cells = [str(stats['count']).rjust(10)]
+                cells += ['{0:10.1f}'.format(stats[c] * 1000) for c in columns[1:]]
+                lines.append(key.ljust(width) + ''.join(cells))
+            lines.append('')
+        return '\n'.join(lines)
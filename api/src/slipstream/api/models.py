@@ -6,16 +6,23 @@ import re
 import warnings
 import collections
 
-from threading import Lock
+from threading import Lock, Thread
 
 
 first_cap_re = re.compile('(.)([A-Z][a-z]+)')
 all_cap_re = re.compile('([a-z0-9])([A-Z])')
 
 
+_snake_names = {}
+
+
 def camel_to_snake(name):
-    s1 = first_cap_re.sub(r'\1_\2', name)
-    return all_cap_re.sub(r'\1_\2', s1).lower()
+    # The resources of a collection share their attribute names: convert each name once
+    snake = _snake_names.get(name)
+    if snake is None:
+        s1 = first_cap_re.sub(r'\1_\2', name)
+        snake = _snake_names[name] = all_cap_re.sub(r'\1_\2', s1).lower()
+    return snake
 
 
 def truncate_middle(max_len, message, truncate_message='...'):
@@ -60,35 +67,176 @@ class CimiResource(CimiResponse):
 
 
 class CimiCollection(CimiResource):
+    """The response of a CIMI search. The resources (CimiResource) are built
+    all at once, the first time they are needed (or in a background thread,
+    see materialize()). len() and indexing only build the resources used."""
 
     def __init__(self, json, resource_type):
         super(CimiCollection, self).__init__(json)
         self.resource_type = resource_type
-        self.__lock_iter = Lock()
-        self.__lock_list = Lock()
-        self.__resources = []
-        self.__json_resources = self.json.get(self.resource_type, [])
+        self._json_resources = self.json.get(self.resource_type) or []
+        self._resources = None
+        self._built = {}
+        self._lock = Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    def _materialize(self):
+        resources = self._resources
+        if resources is not None:
+            return resources
+        with self._lock:
+            if self._resources is None:
+                built = self._built
+                self._resources = [built.get(i) or CimiResource(resource_json)
+                                   for i, resource_json in enumerate(self._json_resources)]
+                self._built = {}
+            return self._resources
+
+    def materialize(self, background=False):
+        """Build all the resources now, or in a daemon thread if 'background' is True.
+
+        :return: The thread building the resources (None if not 'background')
+        """
+        if not background:
+            self._materialize()
+            return None
+        thread = Thread(target=self._materialize, name='slipstream-collection')
+        thread.daemon = True
+        thread.start()
+        return thread
 
     def resources(self):
-        for i in range(len(self.__json_resources)):
-            with self.__lock_iter:
-                if i < len(self.__resources):
-                    yield self.__resources[i]
-                else:
-                    resource = CimiResource(self.__json_resources[i])
-                    self.__resources.append(resource)
-                    yield resource
+        return iter(self._materialize())
 
     @property
     def resources_list(self):
-        with self.__lock_list:
-            if len(self.__resources) != len(self.__json_resources):
-                list(self.resources())
-            return self.__resources
+        return self._materialize()
 
     def __iter__(self):
         return self.resources()
 
+    def __len__(self):
+        return len(self._json_resources)
+
+    def __bool__(self):
+        # True even without resources, as the other responses
+        return True
+
+    __nonzero__ = __bool__
+
+    def _get(self, index):
+        resources = self._resources
+        if resources is not None:
+            return resources[index]
+        resource = self._built.get(index)
+        if resource is None:
+            # setdefault is atomic: all the threads get the same resource
+            resource = self._built.setdefault(index, CimiResource(self._json_resources[index]))
+            resources = self._resources
+            if resources is not None:
+                # Materialized meanwhile
+                return resources[index]
+        return resource
+
+    def __getitem__(self, index):
+        """The resource(s) at 'index' (int or slice), built if needed."""
+        if isinstance(index, slice):
+            resources = self._resources
+            if resources is not None:
+                return resources[index]
+            return [self._get(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('CimiCollection index out of range')
+        return self._get(index)
+
+    def aggregation(self, name):
+        """Value of the aggregation 'name' (e.g. 'terms:state') of the response.
+        See parse_aggregation()."""
+        return parse_aggregation(self.json.get('aggregations', {}).get(name))
+
+
+class StreamingCimiCollection(CimiCollection):
+    """The response of a CIMI search processed as a stream: each resource is
+    built when the iteration reaches it and its JSON is released by the
+    collection (the list of resources of 'json' is consumed). The resources
+    already iterated are not kept, unless 'retain' is True. The resources can
+    therefore only be iterated once, and the response 'json' does not contain
+    them."""
+
+    def __init__(self, json, resource_type, retain=False):
+        json = dict(json)
+        pending = json.pop(resource_type, None) or []
+        super(StreamingCimiCollection, self).__init__(json, resource_type)
+        # Consumed from the end
+        pending.reverse()
+        self._json_resources = pending
+        self._size = len(pending)
+        self._retained = []
+        self.retain = retain
+
+    def resources(self):
+        pending = self._json_resources
+        while True:
+            try:
+                resource_json = pending.pop()
+            except IndexError:
+                return
+            resource = CimiResource(resource_json)
+            if self.retain:
+                self._retained.append(resource)
+            yield resource
+
+    @property
+    def resources_list(self):
+        """The resources not iterated yet (with the retained ones if 'retain' is True).
+
+        :raises TypeError: if the resources were all iterated and not retained
+        """
+        if not self.retain and self._size and not self._json_resources:
+            raise TypeError('The resources of this streaming CimiCollection were already iterated '
+                            '(use retain=True to keep them)')
+        remaining = list(self.resources())
+        return self._retained if self.retain else remaining
+
+    @property
+    def remaining(self):
+        """Number of resources not iterated yet."""
+        return len(self._json_resources)
+
+    def __len__(self):
+        return self._size
+
+    def materialize(self, background=False):
+        raise TypeError('A streaming CimiCollection cannot be materialized')
+
+    def __getitem__(self, index):
+        raise TypeError('A streaming CimiCollection cannot be indexed')
+
+
+def parse_aggregation(value):
+    """Value of a CIMI aggregation: a list of TermsBucket for the bucket aggregations
+    (terms), a number for the single value ones (sum, min, max, avg, count,
+    cardinality, missing) and the dict itself for the others (stats, percentiles)."""
+    if value is None:
+        return None
+    if 'buckets' in value:
+        return [TermsBucket(key=b.get('key'), count=b.get('doc_count')) for b in value['buckets']]
+    if 'value' in value:
+        return value['value']
+    if 'doc_count' in value:
+        return value['doc_count']
+    return value
+
 
 class CloudEntryPoint(CimiResource):
 
@@ -100,6 +248,11 @@ class CloudEntryPoint(CimiResource):
         return dict([(k, v['href']) for k, v in list(self.json.items()) if isinstance(v, dict) and 'href' in v])
 
 
+TermsBucket = collections.namedtuple('TermsBucket', [
+    'key',
+    'count',
+])
+
 App = collections.namedtuple('App', [
     'name',
     'type',
@@ -188,6 +341,14 @@ CloudImageIdentifier = collections.namedtuple('CloudImageIdentifier', [
     'identifier',
 ])
 
+ModuleDetails = collections.namedtuple('ModuleDetails', [
+    'module',
+    'module_reference',
+    'nodes',
+    'parameters',
+    'cloud_image_identifiers',
+])
+
 UserItem = collections.namedtuple('UserItem', [
     'username',
     'email',
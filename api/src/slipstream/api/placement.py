@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Distribute a batch of deployments across the clouds according to the
+ remaining quota::
+
+    from slipstream.api import Api
+    from slipstream.api.placement import Placer, DeploymentRequest
+
+    api = Api()
+    placer = Placer(api, max_workers=8)
+
+    results = placer.deploy([
+        DeploymentRequest('examples/tutorials/service-testing/system',
+                          multiplicity={'apache': 4, 'testclient': 1}, keep_running='always'),
+        DeploymentRequest('examples/images/ubuntu-16.04', clouds=['exoscale-ch-gva', 'exoscale-de-fra']),
+    ])
+    for result in results:
+        print(result.request.path, result.cloud, result.deployment_id, result.error)
+
+ The quota and usage of each cloud come from a ``usage()`` snapshot shared
+ by the placements and refreshed at most every 'ttl' seconds. The VMs placed
+ since the snapshot was taken are counted as pending until the next one.
+ Each node goes to the allowed cloud with the most remaining VMs, and the
+ deployments are submitted concurrently. A deployment rejected by the server
+ (409) refreshes the snapshot and is placed again on the other clouds.
+"""
+
+from __future__ import absolute_import
+
+import time
+import logging
+import threading
+import collections
+
+from multiprocessing.pool import ThreadPool
+
+from requests import RequestException
+
+from .api import SlipStreamError
+
+logger = logging.getLogger(__name__)
+
+PlacementResult = collections.namedtuple('PlacementResult', ['request', 'cloud', 'deployment_id', 'error'])
+
+
+class QuotaExceededError(SlipStreamError):
+    """Raised when no allowed cloud has enough remaining quota for a deployment."""
+
+
+class DeploymentRequest(object):
+    """A deployment to place.
+
+    :param path: The path of the component/application to deploy.
+    :param multiplicity: [Applications] Number of instances per node name. If None the
+                         path is deployed as a component (a single VM).
+    :param clouds: The clouds allowed for this deployment (default to all the clouds with a quota).
+    :param options: Other keyword arguments of Api.deploy() (parameters, tags, keep_running, ...).
+    """
+
+    def __init__(self, path, multiplicity=None, clouds=None, **options):
+        self.path = path
+        self.multiplicity = multiplicity
+        self.clouds = clouds
+        self.options = options
+
+    def demands(self):
+        """Number of VMs needed per node (None for a component)."""
+        if self.multiplicity is None:
+            return [(None, 1)]
+        return [(node, count) for node, count in self.multiplicity.items() if count > 0]
+
+    def __repr__(self):
+        return 'DeploymentRequest({0!r}, multiplicity={1!r}, clouds={2!r})'.format(self.path, self.multiplicity,
+                                                                                   self.clouds)
+
+
+class UsageSnapshot(object):
+    """Cached result of Api.usage() with the VMs reserved since it was taken.
+
+    :param api: The Api used to get the usage.
+    :param ttl: Age (in seconds) after which the snapshot is refreshed.
+    """
+
+    def __init__(self, api, ttl=30):
+        self.api = api
+        self.ttl = ttl
+        self.refreshes = 0
+        self._usage = {}
+        self._taken = None
+        # [time, cloud, count]: the time is None while the deployment is being submitted
+        self._reserved = []
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        del state['_refresh_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _fresh(self):
+        return self._taken is not None and time.time() - self._taken < self.ttl
+
+    def invalidate(self):
+        """Refresh the snapshot at the next use."""
+        with self._lock:
+            self._taken = None
+
+    def refresh(self, force=False):
+        # A single request at a time: the other threads use its result
+        with self._refresh_lock:
+            if self._fresh() and not force:
+                return
+            start = time.time()
+            usage = dict((u.cloud, u) for u in self.api.usage())
+            with self._lock:
+                self._usage = usage
+                self._taken = start
+                # The VMs submitted before the snapshot was taken are part of it
+                self._reserved = [r for r in self._reserved if r[0] is None or r[0] >= start]
+                self.refreshes += 1
+
+    def usage(self):
+        """The usage per cloud (dict of models.Usage)."""
+        if not self._fresh():
+            self.refresh()
+        return dict(self._usage)
+
+    def _remaining(self):
+        remaining = dict((cloud, u.quota - u.vm_usage - u.pending_vm_usage) for cloud, u in self._usage.items())
+        for _, cloud, count in self._reserved:
+            if cloud in remaining:
+                remaining[cloud] -= count
+        return remaining
+
+    def remaining(self):
+        """Number of VMs which can still be started per cloud."""
+        self.usage()
+        with self._lock:
+            return self._remaining()
+
+    def reserve(self, demands, clouds=None, exclude=()):
+        """Choose a cloud for each demand, the allowed cloud with the most remaining VMs,
+        and reserve the VMs.
+
+        :param demands: List of (key, number of VMs).
+        :param clouds: The allowed clouds (default to all).
+        :param exclude: Clouds not to use.
+        :return: (cloud per key, reservations)
+        :raises QuotaExceededError: if a demand does not fit in any allowed cloud
+        """
+        self.usage()
+        with self._lock:
+            remaining = self._remaining()
+            assignment = {}
+            for key, count in sorted(demands, key=lambda d: -d[1]):
+                candidates = [c for c in sorted(remaining)
+                              if (clouds is None or c in clouds) and c not in exclude and remaining[c] >= count]
+                if not candidates:
+                    raise QuotaExceededError('No cloud with {0} VMs available for {1} (remaining: {2})'
+                                             .format(count, key or 'the component', remaining))
+                cloud = max(candidates, key=lambda c: remaining[c])
+                remaining[cloud] -= count
+                assignment[key] = cloud
+            reservations = [[None, assignment[key], count] for key, count in demands]
+            self._reserved.extend(reservations)
+        return assignment, reservations
+
+    def confirm(self, reservations):
+        """The reserved VMs have been submitted: keep them until the next snapshot."""
+        with self._lock:
+            for reservation in reservations:
+                reservation[0] = time.time()
+
+    def release(self, reservations):
+        with self._lock:
+            released = set(id(r) for r in reservations)
+            self._reserved = [r for r in self._reserved if id(r) not in released]
+
+
+class Placer(object):
+    """Place and submit deployments according to the remaining quota of the clouds.
+
+    :param api: The Api used to deploy.
+    :param snapshot: The UsageSnapshot to use (to share it between placers). Default to a new one.
+    :param max_workers: Maximum number of deployments submitted concurrently.
+    :param attempts: Number of clouds tried for a deployment rejected by the server.
+    """
+
+    def __init__(self, api, snapshot=None, max_workers=8, attempts=2):
+        self.api = api
+        self.snapshot = snapshot if snapshot is not None else UsageSnapshot(api)
+        self.max_workers = max_workers
+        self.attempts = attempts
+
+    @staticmethod
+    def _cloud(request, assignment):
+        if request.multiplicity is None:
+            return assignment[None]
+        return assignment
+
+    def plan(self, requests):
+        """Place the deployments without submitting them.
+
+        :return: The cloud (components) or cloud per node (applications) of each
+                 request, or the QuotaExceededError if it does not fit
+        :rtype: list
+        """
+        plan = []
+        reserved = []
+        try:
+            for request in requests:
+                try:
+                    assignment, reservations = self.snapshot.reserve(request.demands(), request.clouds)
+                except QuotaExceededError as e:
+                    plan.append(e)
+                    continue
+                reserved.extend(reservations)
+                plan.append(self._cloud(request, assignment))
+        finally:
+            self.snapshot.release(reserved)
+        return plan
+
+    def deploy(self, requests):
+        """Place and submit the deployments.
+
+        :param requests: The deployments to submit.
+        :type requests: list of DeploymentRequest
+
+        :return: The result of each request, in the same order
+        :rtype: list of PlacementResult
+        """
+        placed = []
+        for request in requests:
+            try:
+                placed.append((request, self.snapshot.reserve(request.demands(), request.clouds)))
+            except (SlipStreamError, RequestException) as e:
+                placed.append((request, e))
+
+        if self.max_workers <= 1 or len(placed) <= 1:
+            return [self._submit(p) for p in placed]
+        pool = ThreadPool(min(self.max_workers, len(placed)))
+        try:
+            return pool.map(self._submit, placed)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _submit(self, placed):
+        request, reservation = placed
+        if isinstance(reservation, Exception):
+            return PlacementResult(request, None, None, reservation)
+
+        tried = set()
+        attempt = 1
+        while True:
+            assignment, reservations = reservation
+            cloud = self._cloud(request, assignment)
+            try:
+                deployment_id = self.api.deploy(request.path, cloud=cloud, multiplicity=request.multiplicity,
+                                                **request.options)
+            except (SlipStreamError, RequestException) as e:
+                self.snapshot.release(reservations)
+                rejected = isinstance(e, SlipStreamError) and e.response is not None and \
+                    e.response.status_code == 409
+                if not rejected or attempt >= self.attempts:
+                    return PlacementResult(request, cloud, None, e)
+                logger.info('Deployment of {0} rejected on {1} ({2}). Placing it again.'.format(request.path, cloud,
+                                                                                             e.reason))
+                tried.update(assignment.values())
+                self.snapshot.invalidate()
+                try:
+                    reservation = self.snapshot.reserve(request.demands(), request.clouds, exclude=tried)
+                except (SlipStreamError, RequestException) as e:
+                    return PlacementResult(request, None, None, e)
+                attempt += 1
+                continue
+            self.snapshot.confirm(reservations)
+            return PlacementResult(request, cloud, deployment_id, None)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Helpers to fan work out over a pool of processes.
+
+ Each worker process receives a copy of the ``Api`` configuration (endpoint,
+ cookie file, credentials, tuning) and builds its own connection pool, so no
+ socket is ever shared between processes.::
+
+    from slipstream.api import Api
+    from slipstream.api.pool import map_deployments
+
+    def describe(api, deployment):
+        return api.get_deployment_parameter(deployment.id, 'ss:state')
+
+    api = Api()
+    states = map_deployments(api, describe, processes=8, limit=500)
+
+"""
+
+from __future__ import absolute_import
+
+import multiprocessing
+
+_process_api = None
+
+
+def _init_worker(api):
+    global _process_api
+    _process_api = api
+
+
+def _call(args):
+    func, item = args
+    return func(_process_api, item)
+
+
+def pool_map(api, func, iterable, processes=None, chunksize=1):
+    """
+    Call ``func(api, item)`` for each item of ``iterable`` in a pool of processes.
+
+    Every worker process uses its own ``Api`` instance built from the
+    configuration of ``api``.
+
+    :param api: The Api instance whose configuration is used in the workers
+    :type api: Api
+    :param func: A picklable (module level) function taking an Api and an item
+    :type func: callable
+    :param iterable: The items to process
+    :param processes: Number of worker processes. Default to the number of CPUs
+    :type processes: int
+    :param chunksize: Number of items sent at once to a worker
+    :type chunksize: int
+
+    :return: The results in the order of the items
+    :rtype: list
+    """
+    pool = multiprocessing.Pool(processes, _init_worker, (api,))
+    try:
+        return pool.map(_call, [(func, item) for item in iterable], chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def map_deployments(api, func, processes=None, chunksize=1, **kwargs):
+    """
+    Call ``func(api, deployment)`` for each deployment returned by
+    ``Api.list_deployments(**kwargs)`` in a pool of processes.
+
+    See pool_map() for the other parameters.
+    """
+    return pool_map(api, func, api.list_deployments(**kwargs), processes, chunksize)
+
+
+def map_virtualmachines(api, func, processes=None, chunksize=1, **kwargs):
+    """
+    Call ``func(api, vm)`` for each virtual machine returned by
+    ``Api.list_virtualmachines(**kwargs)`` in a pool of processes.
+
+    See pool_map() for the other parameters.
+    """
+    return pool_map(api, func, api.list_virtualmachines(**kwargs), processes, chunksize)
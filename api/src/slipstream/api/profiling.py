@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Opt-in profiling of the time spent by the public ``Api`` methods.
+
+ The wall clock and CPU time of each call are split in phases::
+
+    network    sending the requests and receiving the responses (including
+               the wait for the throttle)
+    backoff    sleeping between two attempts of a retried request
+    decode     decoding the bodies of the responses
+    parse      parsing the XML and JSON documents
+    model      building the models (and any other client code)
+    iteration  time spent by the caller between two items of a generator
+               (including the Api calls it does meanwhile)
+
+ ::
+
+    with api.profile('profile.txt') as profiler:
+        deployments = list(api.list_deployments(limit=1000))
+    print(profiler.report())
+
+ With ``functions=True`` the functions called by the current thread are also
+ profiled with ``cProfile`` and the most expensive ones are added to the
+ report. This slows the calls down noticeably.
+"""
+
+from __future__ import absolute_import
+
+import io
+import time
+import threading
+import collections
+
+try:
+    import cProfile
+    import pstats
+except ImportError:
+    cProfile = None
+
+NETWORK = 'network'
+BACKOFF = 'backoff'
+DECODE = 'decode'
+PARSE = 'parse'
+MODEL = 'model'
+ITERATION = 'iteration'
+PHASES = (NETWORK, BACKOFF, DECODE, PARSE, MODEL, ITERATION)
+
+if hasattr(time, 'thread_time'):
+    cpu_time = time.thread_time
+elif hasattr(time, 'process_time'):
+    cpu_time = time.process_time
+else:  # Python 2
+    cpu_time = time.clock
+
+
+class _NullPhase(object):
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_PHASE = _NullPhase()
+
+
+class _Frame(object):
+
+    __slots__ = ('phase', 'operation', 'wall', 'cpu', 'child_wall', 'child_cpu')
+
+    def __init__(self, phase, operation):
+        self.phase = phase
+        self.operation = operation
+        self.wall = time.time()
+        self.cpu = cpu_time()
+        self.child_wall = 0.0
+        self.child_cpu = 0.0
+
+
+class _Phase(object):
+    """Context manager measuring the exclusive time of a phase (the time of
+    the nested phases is only attributed to them)."""
+
+    __slots__ = ('profiler', 'phase', 'operation', 'frame')
+
+    def __init__(self, profiler, phase, operation):
+        self.profiler = profiler
+        self.phase = phase
+        self.operation = operation
+
+    def __enter__(self):
+        stack = self.profiler._stack()
+        operation = stack[0].operation if stack else self.operation
+        self.frame = _Frame(self.phase, operation)
+        stack.append(self.frame)
+        return self.frame
+
+    def __exit__(self, *args):
+        frame = self.frame
+        wall = time.time() - frame.wall
+        cpu = cpu_time() - frame.cpu
+        stack = self.profiler._stack()
+        stack.pop()
+        if stack:
+            stack[-1].child_wall += wall
+            stack[-1].child_cpu += cpu
+        self.profiler.add(frame.operation, frame.phase, wall - frame.child_wall, cpu - frame.child_cpu)
+        return False
+
+
+class Profiler(object):
+    """Accumulate the wall clock and CPU time per operation and phase.
+
+    Each thread attributes the phases to the outermost Api call it is running,
+    so the calls done by other Api methods (e.g. cimi_search by
+    current_session) are part of the calling operation.
+
+    :param functions: Also profile the functions called by the thread running
+                      start() and stop() with cProfile.
+    """
+
+    def __init__(self, functions=False):
+        self.functions = functions and cProfile is not None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._times = collections.defaultdict(lambda: [0, 0.0, 0.0])
+        self._calls = collections.Counter()
+        self._cprofile = None
+        self._started = None
+        self._elapsed = None
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def start(self):
+        self._started = (time.time(), cpu_time())
+        self._elapsed = None
+        if self.functions:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def stop(self):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._started is not None:
+            self._elapsed = (time.time() - self._started[0], cpu_time() - self._started[1])
+
+    def phase(self, phase, operation=None):
+        """Context manager measuring the 'with' block as 'phase' of the
+        current operation ('operation' if there is none yet)."""
+        return _Phase(self, phase, operation)
+
+    def call(self, operation, count=True):
+        """Measure the 'with' block as the 'model' phase of 'operation' (and
+        count a call of it, if it is not nested in another call)."""
+        if count and not self._stack():
+            with self._lock:
+                self._calls[operation] += 1
+        return _Phase(self, MODEL, operation)
+
+    def iteration(self, operation, wall, cpu):
+        """Add the time spent by the caller of the generator 'operation'
+        between two items, unless it is consumed by another Api call."""
+        if not self._stack():
+            self.add(operation, ITERATION, wall, cpu)
+
+    def add(self, operation, phase, wall, cpu):
+        with self._lock:
+            times = self._times[(operation, phase)]
+            times[0] += 1
+            times[1] += wall
+            times[2] += cpu
+
+    def as_dict(self):
+        """{operation: {'calls': n, 'phases': {phase: {'count', 'wall', 'cpu'}}}}"""
+        result = collections.OrderedDict()
+        with self._lock:
+            for (operation, phase), (count, wall, cpu) in sorted(self._times.items(), key=_phase_order):
+                entry = result.setdefault(operation, {'calls': self._calls.get(operation, 0),
+                                                      'phases': collections.OrderedDict()})
+                entry['phases'][phase] = {'count': count, 'wall': wall, 'cpu': cpu}
+        return result
+
+    def report(self, functions=25):
+        """The times per operation and phase (and the 'functions' most
+        expensive functions if they were profiled) as text."""
+        lines = []
+        if self._elapsed is not None:
+            lines.append('Profiled for {0:.3f}s (wall), {1:.3f}s (CPU)'.format(*self._elapsed))
+            lines.append('')
+        header = '{0:<16}{1:>8}{2:>12}{3:>8}{4:>12}{5:>8}'.format('phase', 'count', 'wall (s)', 'wall %',
+                                                                   'cpu (s)', 'cpu %')
+        for operation, entry in self.as_dict().items():
+            phases = entry['phases']
+            total_wall = sum(p['wall'] for p in phases.values())
+            total_cpu = sum(p['cpu'] for p in phases.values())
+            lines.append('{0} ({1} calls)'.format(operation or '(no operation)', entry['calls']))
+            lines.append(header)
+            for phase, p in phases.items():
+                lines.append('{0:<16}{1:>8}{2:>12.4f}{3:>8.1%}{4:>12.4f}{5:>8.1%}'.format(
+                    phase, p['count'], p['wall'], p['wall'] / total_wall if total_wall else 0,
+                    p['cpu'], p['cpu'] / total_cpu if total_cpu else 0))
+            lines.append('{0:<16}{1:>8}{2:>12.4f}{3:>8}{4:>12.4f}'.format('total', '', total_wall, '', total_cpu))
+            lines.append('')
+        if self._cprofile is not None and functions:
+            stream = io.StringIO() if str is not bytes else io.BytesIO()
+            stats = pstats.Stats(self._cprofile, stream=stream)
+            stats.sort_stats('tottime').print_stats(functions)
+            lines.append('Functions (cProfile, current thread only)')
+            lines.append(stream.getvalue())
+        return '\n'.join(lines)
+
+    def write(self, path):
+        """Write the report in the file 'path'."""
+        with open(path, 'w') as f:
+            f.write(self.report())
+
+
+def _phase_order(item):
+    (operation, phase), _ = item
+    return (operation or '', PHASES.index(phase) if phase in PHASES else len(PHASES), phase)
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Build CIMI filters and queries::
+
+    from slipstream.api import Api
+    from slipstream.api.query import Field, Query
+
+    api = Api()
+
+    state_events = (Field('type') == 'state') & Field('content/state').any_of(['Ready', 'Done'])
+    str(state_events)  # "type='state' and (content/state='Ready' or content/state='Done')"
+
+    query = Query('events').where(state_events).order_by('timestamp:desc').select('timestamp', 'content')
+    for event in query.resources(api, page_size=100):
+        print(event.timestamp, event.content)
+
+ Filters and queries are immutable: the CIMI parameters of a query are
+ compiled once and reused by all its searches, which only add the paging
+ (first/last) and, optionally, an extra filter (e.g. a polling cursor).
+"""
+
+from __future__ import absolute_import
+
+import re
+import datetime
+
+import six
+
+_FIELD_RE = re.compile(r'^[\w/:.-]+$')
+
+
+def cimi_value(value):
+    """CIMI literal of a Python value (string, number, boolean, None or datetime)."""
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, six.integer_types + (float,)):
+        return repr(value)
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    value = six.text_type(value)
+    if "'" not in value:
+        return "'{0}'".format(value)
+    if '"' not in value:
+        return '"{0}"'.format(value)
+    raise ValueError('A CIMI string cannot contain both quote characters: {0}'.format(value))
+
+
+class Filter(object):
+    """A CIMI filter. Combine them with '&' (and) and '|' (or)."""
+
+    _text = None
+
+    @staticmethod
+    def of(value):
+        """Filter of a Filter or a CIMI filter string (None if empty)."""
+        if value is None or isinstance(value, Filter):
+            return value
+        return _Raw(value) if value.strip() else None
+
+    def _render(self):
+        raise NotImplementedError()
+
+    def __str__(self):
+        if self._text is None:
+            self._text = self._render()
+        return self._text
+
+    def __repr__(self):
+        return 'Filter({0!r})'.format(str(self))
+
+    def __and__(self, other):
+        return _combine('and', self, other)
+
+    def __rand__(self, other):
+        return _combine('and', other, self)
+
+    def __or__(self, other):
+        return _combine('or', self, other)
+
+    def __ror__(self, other):
+        return _combine('or', other, self)
+
+
+class _Raw(Filter):
+
+    def __init__(self, text):
+        self._text = text.strip()
+
+    def _render(self):
+        return self._text
+
+
+class _Comparison(Filter):
+
+    def __init__(self, field, operator, value):
+        self.field = field
+        self.operator = operator
+        self.value = value
+
+    def _render(self):
+        return '{0}{1}{2}'.format(self.field, self.operator, cimi_value(self.value))
+
+
+class _Logical(Filter):
+
+    def __init__(self, operator, operands):
+        self.operator = operator
+        self.operands = operands
+
+    def _render(self):
+        texts = []
+        for operand in self.operands:
+            text = str(operand)
+            # 'and' binds tighter than 'or'. The raw filters are unknown: always grouped
+            if isinstance(operand, _Raw) or (self.operator == 'and' and isinstance(operand, _Logical)):
+                text = '({0})'.format(text)
+            texts.append(text)
+        return ' {0} '.format(self.operator).join(texts)
+
+
+def _combine(operator, left, right):
+    operands = []
+    for operand in (Filter.of(left), Filter.of(right)):
+        if operand is None:
+            continue
+        if isinstance(operand, _Logical) and operand.operator == operator:
+            operands.extend(operand.operands)
+        else:
+            operands.append(operand)
+    if len(operands) == 1:
+        return operands[0]
+    return _Logical(operator, operands)
+
+
+class Field(object):
+    """An attribute of the CIMI resources, compared to values to build filters::
+
+        Field('state') == 'Ready'             # state='Ready'
+        Field('name').startswith('test-')     # name^='test-'
+        Field('updated') >= '2017-01-01'      # updated>='2017-01-01'
+        Field('acl').not_null()               # acl!=null
+    """
+
+    __hash__ = None
+
+    def __init__(self, name):
+        if not _FIELD_RE.match(name):
+            raise ValueError('Invalid CIMI attribute name: {0}'.format(name))
+        self.name = name
+
+    def __eq__(self, value):
+        return _Comparison(self.name, '=', value)
+
+    def __ne__(self, value):
+        return _Comparison(self.name, '!=', value)
+
+    def __lt__(self, value):
+        return _Comparison(self.name, '<', value)
+
+    def __le__(self, value):
+        return _Comparison(self.name, '<=', value)
+
+    def __gt__(self, value):
+        return _Comparison(self.name, '>', value)
+
+    def __ge__(self, value):
+        return _Comparison(self.name, '>=', value)
+
+    def startswith(self, prefix):
+        return _Comparison(self.name, '^=', prefix)
+
+    def is_null(self):
+        return _Comparison(self.name, '=', None)
+
+    def not_null(self):
+        return _Comparison(self.name, '!=', None)
+
+    def any_of(self, values):
+        """Equal to one of 'values'."""
+        values = list(values)
+        if not values:
+            raise ValueError('any_of() needs at least one value')
+        if len(values) == 1:
+            return self == values[0]
+        return _Logical('or', [self == value for value in values])
+
+
+class Query(object):
+    """An immutable CIMI search of a resource type. The methods return a new Query.
+
+    :param resource_type: Type of the resources (Collection name).
+    :param filter: CIMI filter (Filter or string).
+    """
+
+    def __init__(self, resource_type, filter=None):
+        self.resource_type = resource_type
+        self.filter = Filter.of(filter)
+        self.orderby = ()
+        self.fields = None
+        self.aggregations = ()
+        self._params = None
+
+    def _copy(self, **changes):
+        query = Query.__new__(Query)
+        query.__dict__.update(self.__dict__)
+        query.__dict__.update(changes)
+        query._params = None
+        return query
+
+    def where(self, *filters):
+        """Query of the resources also matching all the 'filters'."""
+        combined = self.filter
+        for f in filters:
+            combined = _combine('and', combined, f) if combined is not None else Filter.of(f)
+        return self._copy(filter=combined)
+
+    def order_by(self, *fields):
+        """Sort by the fields ('field' or 'field:desc'), after the previous ones."""
+        return self._copy(orderby=self.orderby + fields)
+
+    def select(self, *fields):
+        """Only return these attributes (and the id)."""
+        return self._copy(fields=(self.fields or ()) + fields)
+
+    def aggregate(self, *aggregations):
+        """Compute these aggregations (operator:field) with the search."""
+        return self._copy(aggregations=self.aggregations + aggregations)
+
+    def params(self, first=None, last=None, where=None):
+        """Keyword arguments of Api.cimi_search() (compiled once per query).
+
+        :param where: Extra filter ANDed to the one of the query for this search only.
+        """
+        if self._params is None:
+            params = {}
+            if self.filter is not None:
+                params['filter'] = str(self.filter)
+            if self.orderby:
+                params['orderby'] = ','.join(self.orderby)
+            if self.fields:
+                params['fields'] = list(self.fields)
+            if self.aggregations:
+                params['aggregation'] = list(self.aggregations)
+            self._params = params
+        params = dict(self._params)
+        if where is not None:
+            params['filter'] = str(_combine('and', self.filter, where))
+        if first is not None:
+            params['first'] = first
+        if last is not None:
+            params['last'] = last
+        return params
+
+    def search(self, api, first=None, last=None, where=None, stream=False):
+        """Run the query.
+
+        :param stream: Return a StreamingCimiCollection (see Api.cimi_search).
+        :rtype: CimiCollection
+        """
+        return api.cimi_search(self.resource_type, stream=stream, **self.params(first, last, where))
+
+    def pages(self, api, page_size=100, where=None, stream=False):
+        """Generator of the successive pages (CimiCollection) of the results."""
+        first = 1
+        while True:
+            page = self.search(api, first, first + page_size - 1, where, stream)
+            size = len(page)
+            yield page
+            # Also stops if the server ignores the paging and returns everything at once
+            if size != page_size:
+                return
+            first += page_size
+
+    def resources(self, api, page_size=100, where=None, stream=False):
+        """Generator of all the resources of the results (paging through them).
+
+        :param stream: Only keep the resources of the current page not iterated yet in memory.
+        """
+        for page in self.pages(api, page_size, where, stream):
+            for resource in page:
+                yield resource
+
+    def count(self, api, where=None):
+        """Number of resources matching the query."""
+        return api.cimi_count(self.resource_type, self.params(where=where).get('filter'))
+
+    def __repr__(self):
+        return 'Query({0!r}, {1!r})'.format(self.resource_type, self.params())
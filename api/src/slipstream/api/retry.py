@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import absolute_import
+
+import time
+import random
+
+from threading import Lock
+from email.utils import parsedate_tz, mktime_tz
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE'])
+RETRY_STATUS_CODES = frozenset([429, 502, 503, 504])
+
+
+class RetryPolicy(object):
+    """Describe when and how a failed HTTP request has to be retried.
+
+    The delay before the n-th retry is a random value between 0 and
+    ``min(max_backoff, backoff_factor * 2 ** (n - 1))`` ("full jitter"), or
+    exactly this upper bound if ``jitter`` is False. When the server sends a
+    ``Retry-After`` header its value is used instead (bounded by ``max_backoff``).
+    """
+
+    def __init__(self, max_attempts=3, status_codes=RETRY_STATUS_CODES, methods=IDEMPOTENT_METHODS,
+                 backoff_factor=0.5, max_backoff=30, jitter=True, respect_retry_after=True,
+                 retry_on_connection_errors=True):
+        """
+        :param max_attempts: Maximum number of attempts (including the first one).
+        :param status_codes: HTTP status codes which trigger a retry.
+        :param methods: HTTP methods which can be retried. Default to the idempotent ones.
+        :param backoff_factor: Base delay (in seconds) of the exponential backoff.
+        :param max_backoff: Maximum delay (in seconds) between two attempts.
+        :param jitter: Randomize the delay between two attempts.
+        :param respect_retry_after: Use the delay provided by the server in the 'Retry-After' header.
+        :param retry_on_connection_errors: Retry on connection errors (refused, reset, timeout).
+        """
+        self.max_attempts = max_attempts
+        self.status_codes = frozenset(status_codes)
+        self.methods = frozenset(m.upper() for m in methods)
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.respect_retry_after = respect_retry_after
+        self.retry_on_connection_errors = retry_on_connection_errors
+
+    def can_retry(self, method, attempt):
+        """Return True if a request done with 'method' can be attempted again
+        after 'attempt' attempts."""
+        return attempt < self.max_attempts and method.upper() in self.methods
+
+    def is_retryable_response(self, response):
+        return response.status_code in self.status_codes
+
+    def backoff(self, attempt):
+        """Delay (in seconds) to wait after the attempt number 'attempt' (1-based)."""
+        delay = min(self.max_backoff, self.backoff_factor * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def retry_after(self, response):
+        """Delay (in seconds) requested by the server or None."""
+        value = response.headers.get('Retry-After') if response is not None else None
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            date = parsedate_tz(value)
+            if date is None:
+                return None
+            delay = mktime_tz(date) - time.time()
+        return min(self.max_backoff, max(0, delay))
+
+    def delay(self, attempt, response=None):
+        if self.respect_retry_after:
+            delay = self.retry_after(response)
+            if delay is not None:
+                return delay
+        return self.backoff(attempt)
+
+
+class RetryStats(object):
+    """Thread-safe counters of the retries done by a session."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.requests = 0
+        self.retried_requests = 0
+        self.retries = 0
+        self.exhausted = 0
+
+    def record(self, retries, exhausted=False):
+        with self._lock:
+            self.requests += 1
+            self.retries += retries
+            if retries:
+                self.retried_requests += 1
+            if exhausted:
+                self.exhausted += 1
+
+    def as_dict(self):
+        with self._lock:
+            return dict(requests=self.requests,
+                        retried_requests=self.retried_requests,
+                        retries=self.retries,
+                        exhausted=self.exhausted)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Scale the nodes of several scalable deployments at once::
+
+    from slipstream.api import Api
+    from slipstream.api.scaling import FleetScaler
+
+    api = Api()
+    scaler = FleetScaler(api, max_workers=8)
+
+    results = scaler.scale({(deployment_1, 'worker'): 5,
+                            (deployment_2, 'worker'): 2,
+                            (deployment_2, 'db'): 1})
+    for (deployment_id, node_name), result in results.items():
+        if result.error is not None:
+            print(deployment_id, node_name, 'failed:', result.error)
+        else:
+            print(deployment_id, node_name, result.instances)
+
+ The current instances are read from the run document of each deployment
+ and only the difference with the target multiplicity is added or removed
+ (the most recent instances are removed first). The deployments are scaled
+ concurrently, up to 'max_workers' at a time. The nodes of a deployment are
+ scaled one after the other since the server rejects (409) any change while
+ the run is busy; these rejections are retried with an exponential backoff.
+"""
+
+from __future__ import absolute_import
+
+import time
+import logging
+import collections
+
+from multiprocessing.pool import ThreadPool
+
+from requests import RequestException
+
+from .api import SlipStreamError
+from .retry import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+ScaleResult = collections.namedtuple('ScaleResult', ['deployment_id', 'node_name', 'instances', 'added',
+                                                     'removed', 'error'])
+
+# The run stays busy while the previous change is provisioned: wait up to a few minutes
+DEFAULT_RETRY = RetryPolicy(max_attempts=12, status_codes=[409], methods=['POST', 'DELETE'], backoff_factor=2,
+                            max_backoff=60)
+
+
+def is_busy(error):
+    """True if 'error' is the rejection (409) of a change because the run is busy."""
+    response = getattr(error, 'response', None)
+    return isinstance(error, SlipStreamError) and response is not None and response.status_code == 409
+
+
+def instance_id(name):
+    """Id of a node instance from its name (e.g. 3 for 'worker.3')."""
+    return int(str(name).strip().rpartition('.')[2])
+
+
+class FleetScaler(object):
+    """Bring the nodes of scalable deployments to a target multiplicity.
+
+    :param api: The Api used to scale the deployments.
+    :param max_workers: Maximum number of deployments scaled concurrently.
+    :param retry: RetryPolicy of the changes rejected by the server: a change is
+                  retried when its method ('POST' to add, 'DELETE' to remove) is in
+                  'methods' and the status code of the rejection in 'status_codes'.
+    """
+
+    def __init__(self, api, max_workers=8, retry=DEFAULT_RETRY):
+        self.api = api
+        self.max_workers = max_workers
+        self.retry = retry
+
+    def plan(self, targets):
+        """Compute the changes needed to reach the targets, without applying them.
+
+        :param targets: Target multiplicity per (deployment id, node name).
+        :type targets: dict
+
+        :return: (number of instances to add, ids of the instances to remove) per (deployment id, node name)
+        :rtype: dict
+        """
+        plan = {}
+        for deployment_id, nodes in self._by_deployment(targets).items():
+            instances = self.api.get_node_instances(deployment_id)
+            for node_name, multiplicity in nodes.items():
+                plan[(deployment_id, node_name)] = self._diff(instances.get(node_name, []), multiplicity)
+        return plan
+
+    @staticmethod
+    def _by_deployment(targets):
+        deployments = collections.OrderedDict()
+        for (deployment_id, node_name), multiplicity in targets.items():
+            if multiplicity < 0:
+                raise ValueError('Invalid multiplicity {0} for {1}/{2}'.format(multiplicity, deployment_id,
+                                                                               node_name))
+            deployments.setdefault(str(deployment_id), collections.OrderedDict())[node_name] = multiplicity
+        return deployments
+
+    @staticmethod
+    def _diff(current, multiplicity):
+        if multiplicity >= len(current):
+            return multiplicity - len(current), []
+        return 0, sorted(current)[multiplicity:]
+
+    def scale(self, targets):
+        """Add or remove the instances needed to reach the targets.
+
+        A failure only affects its node (and the nodes of the deployment if
+        the run document cannot be read): it is returned in the result.
+
+        :param targets: Target multiplicity per (deployment id, node name).
+        :type targets: dict
+
+        :return: The result per (deployment id, node name)
+        :rtype: dict of ScaleResult
+        """
+        deployments = list(self._by_deployment(targets).items())
+        if self.max_workers <= 1 or len(deployments) <= 1:
+            scaled = [self._scale_deployment(d) for d in deployments]
+        else:
+            pool = ThreadPool(min(self.max_workers, len(deployments)))
+            try:
+                scaled = pool.map(self._scale_deployment, deployments)
+            finally:
+                pool.close()
+                pool.join()
+
+        results = {}
+        for deployment_results in scaled:
+            for result in deployment_results:
+                results[(result.deployment_id, result.node_name)] = result
+        return results
+
+    def _scale_deployment(self, deployment):
+        deployment_id, nodes = deployment
+        try:
+            instances = self.api.get_node_instances(deployment_id)
+        except (SlipStreamError, RequestException) as e:
+            logger.warning('Cannot read the instances of deployment {0}: {1}'.format(deployment_id, e))
+            return [ScaleResult(deployment_id, node_name, None, [], [], e) for node_name in nodes]
+        return [self._scale_node(deployment_id, node_name, instances.get(node_name, []), multiplicity)
+                for node_name, multiplicity in nodes.items()]
+
+    def _scale_node(self, deployment_id, node_name, current, multiplicity):
+        to_add, to_remove = self._diff(current, multiplicity)
+        added = []
+        removed = []
+        try:
+            if to_add:
+                names = self._call('POST', self.api.add_node_instances, deployment_id, node_name, to_add)
+                added = [instance_id(name) for name in names if name.strip()]
+            if to_remove:
+                self._call('DELETE', self.api.remove_node_instances, deployment_id, node_name, to_remove)
+                removed = to_remove
+        except (SlipStreamError, RequestException, ValueError) as e:
+            logger.warning('Cannot scale {0}/{1} to {2}: {3}'.format(deployment_id, node_name, multiplicity, e))
+            error = e
+        else:
+            error = None
+        instances = sorted(set(current).difference(removed).union(added))
+        return ScaleResult(deployment_id, node_name, instances, added, removed, error)
+
+    def _call(self, method, func, *args):
+        """Call 'func' (sending a 'method' request), retrying the rejections allowed by the retry policy."""
+        attempt = 1
+        while True:
+            try:
+                return func(*args)
+            except SlipStreamError as e:
+                if e.response is None or not self.retry.can_retry(method, attempt) or \
+                        not self.retry.is_retryable_response(e.response):
+                    raise
+                delay = self.retry.delay(attempt, e.response)
+                logger.info('Deployment {0} rejected the change ({1}). Retrying in {2:.1f}s.'
+                            .format(args[0], e.reason, delay))
+                time.sleep(delay)
+                attempt += 1
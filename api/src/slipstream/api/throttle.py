@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Client side rate limiting and concurrency control.
+
+ A ``Throttle`` holds, for each request class ('read', 'write', 'deploy'), a
+ token bucket limiting the request rate and a semaphore limiting the number of
+ requests in flight. A throttle can be shared by several ``Api`` instances::
+
+    from slipstream.api import Api
+    from slipstream.api.throttle import shared_throttle
+
+    throttle = shared_throttle('https://nuv.la',
+                               read=dict(rate=20, burst=40, max_in_flight=8),
+                               deploy=dict(rate=0.5, max_in_flight=2))
+    api1 = Api('https://nuv.la', throttle=throttle)
+    api2 = Api('https://nuv.la', throttle=throttle)
+
+"""
+
+from __future__ import absolute_import
+
+import time
+
+from contextlib import contextmanager
+from threading import Lock, Semaphore
+
+READ = 'read'
+WRITE = 'write'
+DEPLOY = 'deploy'
+REQUEST_CLASSES = (READ, WRITE, DEPLOY)
+
+READ_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+_shared_throttles = {}
+_shared_throttles_lock = Lock()
+
+
+def request_class_for_method(method):
+    return READ if method.upper() in READ_METHODS else WRITE
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket allowing 'rate' acquisitions per second on
+    average, with bursts of at most 'burst' acquisitions."""
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError('"rate" should be positive, not "{0}"'.format(rate))
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self._tokens = self.burst
+        self._last = time.time()
+        self._lock = Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def _check(self, tokens):
+        if tokens > self.burst:
+            raise ValueError('Cannot acquire {0} tokens at once: more than the burst ({1})'.format(tokens,
+                                                                                                 self.burst))
+
+    def try_acquire(self, tokens=1):
+        """Take 'tokens' tokens if available.
+
+        :return: 0 on success, otherwise the time (in seconds) to wait before they are available
+        :rtype: float
+        :raises ValueError: if 'tokens' is more than the burst (they would never be available)
+        """
+        self._check(tokens)
+        with self._lock:
+            self._refill(time.time())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """Block until 'tokens' tokens are taken.
+
+        :return: The time spent waiting (in seconds)
+        :rtype: float
+        :raises ValueError: if 'tokens' is more than the burst
+        """
+        self._check(tokens)
+        waited = 0
+        while True:
+            delay = self.try_acquire(tokens)
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+
+class _ClassLimiter(object):
+
+    def __init__(self, rate=None, burst=None, max_in_flight=None):
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.semaphore = Semaphore(max_in_flight) if max_in_flight else None
+        self.lock = Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.wait_time = 0.0
+
+
+class Throttle(object):
+    """Rate limiter and concurrency governor per request class.
+
+    :param limits: for each request class ('read', 'write', 'deploy'), a dict
+                   with the optional keys 'rate' (requests per second),
+                   'burst' and 'max_in_flight'. Classes without limits are
+                   not throttled.
+    """
+
+    def __init__(self, name=None, **limits):
+        for request_class in limits:
+            if request_class not in REQUEST_CLASSES:
+                raise ValueError('Unknown request class "{0}". Should be one of {1}'
+                                 .format(request_class, REQUEST_CLASSES))
+        self.name = name
+        self.limits = limits
+        self._limiters = dict((k, _ClassLimiter(**v)) for k, v in limits.items() if v)
+
+    def __reduce__(self):
+        # Locks cannot be pickled: rebuild the throttle (shared by name if it was shared)
+        return _restore_throttle, (self.name, self.limits)
+
+    @contextmanager
+    def limit(self, request_class):
+        """Context manager waiting for a slot of 'request_class' before
+        entering and releasing it when leaving."""
+        limiter = self._limiters.get(request_class)
+        if limiter is None:
+            yield
+            return
+
+        start = time.time()
+        if limiter.semaphore is not None:
+            limiter.semaphore.acquire()
+        try:
+            if limiter.bucket is not None:
+                limiter.bucket.acquire()
+            with limiter.lock:
+                limiter.requests += 1
+                limiter.in_flight += 1
+                limiter.wait_time += time.time() - start
+            try:
+                yield
+            finally:
+                with limiter.lock:
+                    limiter.in_flight -= 1
+        finally:
+            if limiter.semaphore is not None:
+                limiter.semaphore.release()
+
+    def stats(self):
+        """Number of requests, requests in flight and total waiting time per request class."""
+        stats = {}
+        for request_class, limiter in self._limiters.items():
+            with limiter.lock:
+                stats[request_class] = dict(requests=limiter.requests,
+                                            in_flight=limiter.in_flight,
+                                            wait_time=limiter.wait_time)
+        return stats
+
+
+def _restore_throttle(name, limits):
+    if name is None:
+        return Throttle(**limits)
+    return shared_throttle(name, **limits)
+
+
+def shared_throttle(name, **limits):
+    """Return the Throttle registered under 'name' (usually the endpoint) in
+    this process, creating it with 'limits' if it doesn't exist yet."""
+    with _shared_throttles_lock:
+        throttle = _shared_throttles.get(name)
+        if throttle is None:
+            throttle = _shared_throttles[name] = Throttle(name, **limits)
+        return throttle
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Optional distributed tracing with OpenTelemetry.
+
+ When the ``opentelemetry-api`` package is installed, each public ``Api``
+ method creates a span, with child spans for the HTTP requests, the
+ reauthentications and the parsing of the responses. The trace context is
+ propagated to the server in the request headers. Without OpenTelemetry the
+ tracer does nothing.
+"""
+
+from __future__ import absolute_import
+
+from contextlib import contextmanager
+
+try:
+    from opentelemetry import trace as otel_trace
+    from opentelemetry import propagate as otel_propagate
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:
+    otel_trace = None
+
+INSTRUMENTATION_NAME = 'slipstream.api'
+
+
+class Tracer(object):
+    """Create OpenTelemetry spans, or nothing if OpenTelemetry is not available.
+
+    :param tracer: The OpenTelemetry tracer to use. Default to the one of the
+                   global tracer provider.
+    :param propagate: Inject the trace context in the headers of the requests.
+    """
+
+    def __init__(self, tracer=None, propagate=True):
+        self.propagate = propagate
+        self._tracer = tracer
+        if self._tracer is None and otel_trace is not None:
+            self._tracer = otel_trace.get_tracer(INSTRUMENTATION_NAME)
+
+    def __reduce__(self):
+        # The OpenTelemetry tracer belongs to the process: use the global one after unpickling
+        return Tracer, (None, self.propagate)
+
+    @property
+    def enabled(self):
+        return self._tracer is not None
+
+    def start_span(self, name, attributes=None, client=False):
+        if self._tracer is None:
+            return None
+        kind = SpanKind.CLIENT if client else SpanKind.INTERNAL
+        return self._tracer.start_span(name, kind=kind, attributes=attributes)
+
+    @contextmanager
+    def activate(self, span):
+        """Make 'span' the current span inside the 'with' block, without ending it."""
+        if span is None:
+            yield
+            return
+        with otel_trace.use_span(span, end_on_exit=False):
+            yield
+
+    @staticmethod
+    def end_span(span, error=None):
+        if span is None:
+            return
+        if error is not None:
+            span.record_exception(error)
+            span.set_status(Status(StatusCode.ERROR, str(error)))
+        span.end()
+
+    @contextmanager
+    def span(self, name, attributes=None, client=False):
+        """Context manager creating a span, current inside the 'with' block.
+        Yield the span (None if tracing is disabled)."""
+        if self._tracer is None:
+            yield None
+            return
+        span = self.start_span(name, attributes, client)
+        error = None
+        try:
+            with self.activate(span):
+                yield span
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.end_span(span, error)
+
+    def inject(self, headers):
+        """Add the headers propagating the current trace context to 'headers' (dict)."""
+        if self._tracer is not None and self.propagate:
+            otel_propagate.inject(headers)
+        return headers
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+ Watch the state of deployments with adaptive polling::
+
+    from slipstream.api import Api
+    from slipstream.api.watcher import DeploymentWatcher
+
+    api = Api()
+    watcher = DeploymentWatcher(api, max_requests_per_second=2)
+
+    def changed(deployment_id, old_state, new_state):
+        print(deployment_id, old_state, '->', new_state)
+
+    watcher.watch(deployment_id, changed)
+    watcher.start()  # or watcher.run() to poll from the current thread
+
+    # Or simply wait for a state
+    state = watcher.wait_for(deployment_id, ['ready'], timeout=1800)
+
+ Each deployment is polled according to its state: every few seconds while
+ it is provisioning, rarely once it is ready, and not anymore once it is
+ finished. The interval grows while the state does not change. When several
+ polls are due at the same time they are answered by a single listing of the
+ deployments. All the requests share a global budget (token bucket).
+"""
+
+from __future__ import absolute_import
+
+import time
+import heapq
+import random
+import logging
+import threading
+
+from requests import RequestException
+
+from .api import SlipStreamError
+from .throttle import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATES = frozenset(['done', 'aborted', 'cancelled'])
+
+DEFAULT_INTERVALS = {
+    None: 2,
+    'initializing': 5,
+    'provisioning': 5,
+    'executing': 5,
+    'sendingreports': 3,
+    'finalizing': 3,
+    'ready': 60,
+}
+DEFAULT_INTERVAL = 15
+
+
+class _Watch(object):
+
+    __slots__ = ('deployment_id', 'state', 'interval', 'due', 'callbacks', 'polls')
+
+    def __init__(self, deployment_id, state, due):
+        self.deployment_id = deployment_id
+        self.state = state
+        self.interval = None
+        self.due = due
+        self.callbacks = []
+        self.polls = 0
+
+
+class DeploymentWatcher(object):
+    """Poll the state of the watched deployments and call the callbacks when it changes.
+
+    :param api: The Api used to poll.
+    :param intervals: Base poll interval (in seconds) per state (lower case, None for
+                      the unknown initial state). See DEFAULT_INTERVALS.
+    :param growth: Factor applied to the interval after each poll without change.
+    :param max_interval: Maximum poll interval (in seconds).
+    :param max_requests_per_second: Global budget of requests (average rate).
+    :param burst: Maximum number of requests sent in a burst.
+    :param batch_threshold: Minimum number of due polls answered by a listing of
+                            the deployments instead of individual requests.
+    :param batch_limit: Number of deployments listed by a batched poll.
+    :param on_change: Callback called with (deployment_id, old_state, new_state)
+                      for all the watched deployments.
+    """
+
+    def __init__(self, api, intervals=None, growth=1.5, max_interval=300, max_requests_per_second=2, burst=None,
+                 batch_threshold=3, batch_limit=500, on_change=None):
+        self.api = api
+        self.intervals = dict(DEFAULT_INTERVALS)
+        self.intervals.update(intervals or {})
+        self.growth = growth
+        self.max_interval = max_interval
+        self.budget = TokenBucket(max_requests_per_second, burst)
+        self.batch_threshold = batch_threshold
+        self.batch_limit = batch_limit
+        self.on_change = on_change
+        self.requests = 0
+        self._watches = {}
+        self._queue = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def watch(self, deployment_id, callback=None, state=None):
+        """Start watching a deployment (polled as soon as possible).
+
+        :param callback: Called with (deployment_id, old_state, new_state) when its state changes.
+        :param state: The state of the deployment, if known.
+        """
+        deployment_id = str(deployment_id)
+        with self._lock:
+            watch = self._watches.get(deployment_id)
+            if watch is None:
+                watch = self._watches[deployment_id] = _Watch(deployment_id, state, time.time())
+                heapq.heappush(self._queue, (watch.due, deployment_id))
+            if callback is not None:
+                watch.callbacks.append(callback)
+            self._wakeup.notify_all()
+
+    def unwatch(self, deployment_id):
+        with self._lock:
+            self._watches.pop(str(deployment_id), None)
+
+    def state(self, deployment_id):
+        """Last known state of a watched deployment (lower case) or None."""
+        watch = self._watches.get(str(deployment_id))
+        return watch.state if watch is not None else None
+
+    def __len__(self):
+        return len(self._watches)
+
+    def _interval(self, watch, changed):
+        base = self.intervals.get(watch.state, DEFAULT_INTERVAL)
+        if changed or watch.interval is None:
+            watch.interval = base
+        else:
+            watch.interval = min(self.max_interval, max(base, watch.interval * self.growth))
+        # Jitter, so that the deployments started together are not polled together forever
+        return watch.interval * random.uniform(0.9, 1.1)
+
+    def _due(self, now):
+        """Pop the watches due at 'now' from the queue."""
+        due = []
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now:
+                _, deployment_id = heapq.heappop(self._queue)
+                watch = self._watches.get(deployment_id)
+                if watch is not None and watch.due <= now:
+                    due.append(watch)
+        return due
+
+    def _reschedule(self, watch, due):
+        with self._lock:
+            if self._watches.get(watch.deployment_id) is watch:
+                watch.due = due
+                heapq.heappush(self._queue, (due, watch.deployment_id))
+
+    def _spend(self):
+        """Take a request from the budget. Return the time to wait if there is none left."""
+        delay = self.budget.try_acquire()
+        if not delay:
+            with self._lock:
+                self.requests += 1
+        return delay
+
+    def _poll_one(self, watch):
+        state = self.api.get_deployment_parameter(watch.deployment_id, 'ss:state', ignore_abort=True)
+        if isinstance(state, bytes):
+            state = state.decode('utf-8')
+        return state.strip().lower()
+
+    def _poll_batch(self):
+        states = {}
+        for deployment in self.api.list_deployments(limit=self.batch_limit):
+            states[str(deployment.id)] = deployment.status
+        return states
+
+    def run_once(self):
+        """Poll the deployments which are due (within the budget).
+
+        :return: Time (in seconds) until the next poll is due, None if no deployment is watched
+        :rtype: float
+        """
+        now = time.time()
+        due = self._due(now)
+        states = {}
+        if len(due) >= self.batch_threshold:
+            if not self._spend():
+                try:
+                    states = self._poll_batch()
+                except (SlipStreamError, RequestException) as e:
+                    logger.warning('Listing the deployments failed: {0}'.format(e))
+
+        for i, watch in enumerate(due):
+            state = states.get(watch.deployment_id)
+            if state is None:
+                wait = self._spend()
+                if wait:
+                    # Out of budget: the remaining polls are postponed
+                    for postponed in due[i:]:
+                        self._reschedule(postponed, now + wait)
+                    break
+                try:
+                    state = self._poll_one(watch)
+                except (SlipStreamError, RequestException) as e:
+                    logger.warning('Polling deployment {0} failed: {1}'.format(watch.deployment_id, e))
+                    self._reschedule(watch, time.time() + self._interval(watch, False))
+                    continue
+            self._update(watch, state)
+
+        with self._lock:
+            if not self._watches:
+                return None
+            while self._queue and self._queue[0][1] not in self._watches:
+                heapq.heappop(self._queue)
+            return max(0, self._queue[0][0] - time.time()) if self._queue else None
+
+    def _update(self, watch, state):
+        with self._lock:
+            watch.polls += 1
+            old_state = watch.state
+            watch.state = state
+        changed = state != old_state
+        if state in TERMINAL_STATES:
+            self.unwatch(watch.deployment_id)
+        else:
+            self._reschedule(watch, time.time() + self._interval(watch, changed))
+        if changed:
+            callbacks = list(watch.callbacks)
+            if self.on_change is not None:
+                callbacks.append(self.on_change)
+            for callback in callbacks:
+                try:
+                    callback(watch.deployment_id, old_state, state)
+                except Exception:
+                    logger.exception('State change callback of deployment {0} failed.'.format(watch.deployment_id))
+
+    def run(self, timeout=None):
+        """Poll until stop() is called, no deployment is watched anymore or 'timeout' seconds elapsed."""
+        deadline = time.time() + timeout if timeout is not None else None
+        while not self._stopped.is_set():
+            delay = self.run_once()
+            if delay is None:
+                return
+            if deadline is not None:
+                if time.time() >= deadline:
+                    return
+                delay = min(delay, deadline - time.time())
+            with self._lock:
+                # Woken up early when a deployment is added
+                self._wakeup.wait(delay)
+
+    def start(self):
+        """Poll from a daemon thread."""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run_forever, name='slipstream-watcher')
+        self._thread.daemon = True
+        self._thread.start()
+        return self._thread
+
+    def _run_forever(self):
+        while not self._stopped.is_set():
+            self.run()
+            with self._lock:
+                if not self._watches and not self._stopped.is_set():
+                    self._wakeup.wait(1)
+
+    def stop(self):
+        self._stopped.set()
+        with self._lock:
+            self._wakeup.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+            self._thread = None
+
+    def wait_for(self, deployment_id, states, timeout=None):
+        """Watch a deployment until it reaches one of 'states' (or a terminal state).
+
+        Poll from the current thread, unless the watcher was started.
+
+        :return: The state reached, or None on timeout
+        """
+        states = set(s.lower() for s in states)
+        reached = threading.Event()
+        result = []
+
+        def callback(_, old_state, new_state):
+            if new_state in states or new_state in TERMINAL_STATES:
+                result.append(new_state)
+                reached.set()
+
+        self.watch(deployment_id, callback)
+        state = self.state(deployment_id)
+        if state in states:
+            self._remove_callback(deployment_id, callback)
+            return state
+        deadline = time.time() + timeout if timeout is not None else None
+        while not reached.is_set():
+            remaining = deadline - time.time() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                break
+            if self._thread is not None:
+                reached.wait(remaining)
+            else:
+                delay = self.run_once()
+                if delay is None or reached.is_set():
+                    break
+                time.sleep(min(delay, remaining) if remaining is not None else delay)
+        self._remove_callback(deployment_id, callback)
+        return result[0] if result else None
+
+    def _remove_callback(self, deployment_id, callback):
+        with self._lock:
+            watch = self._watches.get(str(deployment_id))
+            if watch is not None and callback in watch.callbacks:
+                watch.callbacks.remove(callback)
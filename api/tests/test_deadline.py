@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import absolute_import
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+import requests
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from slipstream.api import Api, DeadlineExceededError  # noqa: E402
+
+RESPONSE_DELAY = 1.0
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        time.sleep(RESPONSE_DELAY)
+        try:
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        except (IOError, OSError):
+            pass  # the client gave up
+
+    def log_message(self, *args):
+        pass
+
+
+class DeadlineTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), SlowHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.url = 'http://127.0.0.1:{0}/slow'.format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.api = Api('http://127.0.0.1:{0}'.format(self.server.server_address[1]),
+                       cookie_file=os.path.join(self.tmp_dir, 'cookies.txt'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_timeout_capped_by_deadline(self):
+        start = time.time()
+        with self.api.call_options(deadline=0.2, timeout=30):
+            with self.assertRaises(DeadlineExceededError) as context:
+                self.api.session.get(self.url)
+        self.assertLess(time.time() - start, RESPONSE_DELAY)
+        self.assertIsInstance(getattr(context.exception, '__cause__', requests.Timeout()), requests.Timeout)
+
+    def test_timeout_not_capped(self):
+        # The request timeout is reached before the deadline: not a deadline error
+        with self.api.call_options(deadline=30, timeout=0.2):
+            with self.assertRaises(requests.Timeout):
+                self.api.session.get(self.url)
+
+    def test_deadline_already_reached(self):
+        with self.api.call_options(deadline=0.2):
+            time.sleep(0.3)
+            with self.assertRaises(DeadlineExceededError):
+                self.api.session.get(self.url)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2017 SixSq (http://sixsq.com/).
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import absolute_import
+
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from slipstream.api import models, SlipStreamError  # noqa: E402
+from slipstream.api.events import EventFeed  # noqa: E402
+
+_CURSOR_RE = re.compile(r"^timestamp>='([^']*)'$")
+
+
+class FakeApi(object):
+    """In memory events, searched like the CIMI server does (cursor filter, order and paging)."""
+
+    def __init__(self):
+        self.events = []
+        self.searches = 0
+        self.failing_searches = set()
+
+    def add(self, event_id, timestamp):
+        self.events.append({'id': event_id, 'timestamp': timestamp})
+
+    def cimi_search(self, resource_type, stream=False, filter=None, orderby=None, first=None, last=None,
+                    **kwargs):
+        self.searches += 1
+        if self.searches in self.failing_searches:
+            raise SlipStreamError('503')
+        events = self.events
+        if filter:
+            match = _CURSOR_RE.match(filter)
+            if match is None:
+                raise ValueError('Unexpected filter: {0}'.format(filter))
+            events = [e for e in events if e['timestamp'] >= match.group(1)]
+        events = sorted(events, key=lambda e: (e['timestamp'], e['id']))
+        if first is not None:
+            events = events[first - 1:last]
+        return models.CimiCollection({'count': len(events), 'events': events}, resource_type)
+
+
+class EventFeedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeApi()
+        self.feed = EventFeed(self.api, start=EventFeed.BEGINNING, page_size=2)
+
+    def ids(self):
+        return [e.id for e in self.feed.poll()]
+
+    def test_pages_through_burst(self):
+        for i in range(5):
+            self.api.add('event/{0}'.format(i), '2017-01-01T00:00:0{0}Z'.format(i))
+        self.assertEqual(self.ids(), ['event/{0}'.format(i) for i in range(5)])
+        self.assertEqual(self.ids(), [])
+
+    def test_late_event_at_cursor_timestamp(self):
+        self.api.add('event/b', '2017-01-01T00:00:00Z')
+        self.api.add('event/c', '2017-01-01T00:00:00Z')
+        self.api.add('event/d', '2017-01-01T00:00:00Z')
+        self.assertEqual(self.ids(), ['event/b', 'event/c', 'event/d'])
+
+        # Created late with the timestamp of the cursor, sorting before the events seen
+        self.api.add('event/a', '2017-01-01T00:00:00Z')
+        self.api.add('event/e', '2017-01-01T00:00:01Z')
+        self.assertEqual(self.ids(), ['event/a', 'event/e'])
+        self.assertEqual(self.feed.cursor, ('2017-01-01T00:00:01Z', frozenset(['event/e'])))
+        self.assertEqual(self.ids(), [])
+
+    def test_page_failure_does_not_move_cursor(self):
+        for i in range(5):
+            self.api.add('event/{0}'.format(i), '2017-01-01T00:00:0{0}Z'.format(i))
+        self.api.failing_searches.add(2)
+        feed = EventFeed(self.api, start=EventFeed.BEGINNING, page_size=2, follow=False, interval=0)
+        self.assertEqual([e.id for e in feed], ['event/{0}'.format(i) for i in range(5)])
+        self.assertEqual(feed.errors, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()